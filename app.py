@@ -2,12 +2,28 @@ import streamlit as st
 import pandas as pd
 import folium
 from streamlit_folium import st_folium
-from geopy.geocoders import Nominatim
-from geopy.extra.rate_limiter import RateLimiter
 import os
 import datetime
-import base64
 import textwrap
+import time
+
+from standort.normalize import COLUMNS, normalize_status, safe_float
+from standort.routing import MAX_STOPS, OVERDUE_DAYS, most_urgent, plan_routes, route_candidates
+from standort.spatial import SpatialIndex
+from standort.storage import ConflictError, new_site_id, open_storage, row_etags
+from standort.export import EXPORT_FOLDER, bundle_zip, export_bundle
+from standort.filters import filter_locations, page_count, page_slice
+from standort.geocache import GEOCACHE_FILE, GeoCache, geocode_cached
+from standort.geocode import LazyGeocoder
+from standort.history import HISTORY_FILE, StatusHistory, change_events, overdue_by_age
+from standort.jobs import DONE as JOB_DONE, RUNNING as JOB_RUNNING, list_jobs, resume_job, resume_jobs, start_import_job
+from standort.mapview import ROUTE_COLORS, add_route, add_site_markers, find_site_at, geocoded
+from standort.matching import ImportMerger
+from standort.perf import PerfLog
+from standort.thumbs import ensure_thumbnail, thumbnail_base64
+
+# Gesamtzeit des Reruns für das Leistungs-Panel (Verwaltung)
+_rerun_t0 = time.perf_counter()
 
 # --- PAGE CONFIG ---
 st.set_page_config(
@@ -26,6 +42,10 @@ if 'detail_id' not in st.session_state:
     st.session_state.detail_id = None
 if 'view_mode' not in st.session_state:
     st.session_state.view_mode = 'Liste'
+if 'list_page' not in st.session_state:
+    st.session_state.list_page = 0
+if 'table_page' not in st.session_state:
+    st.session_state.table_page = 0
 
 # --- HELPER ---
 DATA_FOLDER = 'data'
@@ -33,16 +53,6 @@ IMAGE_FOLDER = 'data/images'
 os.makedirs(DATA_FOLDER, exist_ok=True)
 os.makedirs(IMAGE_FOLDER, exist_ok=True)
 
-# WICHTIGE HILFSFUNKTION: Rettet Zahlen mit Kommas
-def safe_float(val):
-    if val is None: return 0.0
-    try:
-        # String säubern: Komma zu Punkt, Leerzeichen weg
-        clean_val = str(val).replace(',', '.').strip()
-        return float(clean_val)
-    except (ValueError, TypeError):
-        return 0.0
-
 def save_uploaded_image(uploaded_file, entry_id):
     if uploaded_file is None: return None
     file_ext = uploaded_file.name.split('.')[-1]
@@ -50,12 +60,56 @@ def save_uploaded_image(uploaded_file, entry_id):
     file_path = os.path.join(IMAGE_FOLDER, file_name)
     with open(file_path, "wb") as f:
         f.write(uploaded_file.getbuffer())
+    # Vorschaubild gleich mit erzeugen, Liste und Karte nutzen nur noch dieses
+    ensure_thumbnail(file_path)
     return file_path
 
-def get_image_base64(file_path):
-    if not file_path or not os.path.exists(file_path): return None
-    with open(file_path, "rb") as img_file:
-        return base64.b64encode(img_file.read()).decode('utf-8')
+LIST_PAGE_SIZE = 25
+
+def _reset_list_page():
+    st.session_state.list_page = 0
+
+def _change_list_page(step):
+    st.session_state.list_page += step
+
+TABLE_PAGE_SIZE = 50
+
+def _reset_table_page():
+    # Anderer Ausschnitt -> offene Editor-Änderungen gehören nicht mehr zu den angezeigten Zeilen
+    st.session_state.table_page = 0
+    st.session_state.pop("table_editor", None)
+
+def _change_table_page(step):
+    st.session_state.table_page += step
+    st.session_state.pop("table_editor", None)
+
+def editor_changes(shown, changes):
+    # Übersetzt den Änderungsstand von st.data_editor (Positionen relativ zu shown)
+    # in (upserts, inserts, deletes). Nur angefasste Zeilen, nicht die ganze Tabelle.
+    deletes = {str(shown.iloc[pos]["id"]) for pos in changes.get("deleted_rows", []) if pos < len(shown)}
+    updated = []
+    for pos, cells in changes.get("edited_rows", {}).items():
+        pos = int(pos)
+        if pos >= len(shown): continue
+        row = shown.iloc[pos].copy()
+        if cells.get("Löschen?"):
+            deletes.add(str(row["id"]))
+            continue
+        cells = {k: v for k, v in cells.items() if k in row.index and k != "Löschen?"}
+        if not cells: continue
+        for col, val in cells.items():
+            row[col] = val
+        updated.append(row)
+    added = []
+    for cells in changes.get("added_rows", []):
+        cells = {k: v for k, v in cells.items() if k in COLUMNS and k != "id"}
+        if not any(v not in (None, "") for v in cells.values()): continue
+        added.append(pd.Series({col: "" for col in COLUMNS} | cells | {"id": new_site_id()}))
+    upserts = pd.DataFrame(updated, columns=COLUMNS).reset_index(drop=True) if updated else pd.DataFrame(columns=COLUMNS)
+    upserts = upserts[~upserts["id"].isin(deletes)]
+    # Neue Zeilen nie per Upsert: eine doppelte id darf keinen vorhandenen Standort überschreiben
+    inserts = pd.DataFrame(added, columns=COLUMNS).reset_index(drop=True) if added else pd.DataFrame(columns=COLUMNS)
+    return upserts, inserts, sorted(deletes)
 
 # --- CSS DESIGN ---
 st.markdown("""
@@ -137,48 +191,165 @@ st.markdown("""
 
 
 # --- DATA LOGIC ---
-CSV_FILE = 'data/locations.csv'
-geolocator = Nominatim(user_agent="berlin_coord_fix")
-geocode = RateLimiter(geolocator.geocode, min_delay_seconds=1.5)
+# Nominatim erst bei der ersten Adresse, die nicht im Cache steht
+geocode = LazyGeocoder()
+
+@st.cache_resource
+def get_geocache():
+    return GeoCache(GEOCACHE_FILE)
+
+@st.cache_resource
+def get_history():
+    return StatusHistory(HISTORY_FILE)
+
+@st.cache_resource
+def get_perf():
+    # Laufzeiten der letzten Reruns aller Sitzungen
+    return PerfLog()
+
+def show_map(m, name, **kwargs):
+    # st_folium mit Zeitmessung. Die Größe des Karten-HTML kostet ein zweites Rendern
+    # und wird daher nur gemessen, wenn sie im Leistungs-Panel eingeschaltet ist.
+    nbytes = len(m.get_root().render()) if st.session_state.get("perf_sizes") else None
+    with get_perf().timed(f"st_folium ({name})") as sample:
+        sample["bytes"] = nbytes
+        return st_folium(m, **kwargs)
+
+def thumb_b64(path):
+    with get_perf().timed("bild") as sample:
+        b64 = thumbnail_base64(path)
+        sample["bytes"] = len(b64) if b64 else 0
+    return b64
+
+@st.cache_resource
+def get_storage():
+    # SQLite (Standard) oder CSV, siehe STANDORT_STORAGE
+    return open_storage()
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _load_data_cached(backend, signature):
+    # signature ist nur Cache-Key: unveränderte Daten -> kein erneutes Laden
+    return get_storage().load()
 
 def load_data():
-    cols = ["id", "nummer", "bundesnummer", "strasse", "plz", "stadt", "typ", "letzte_kontrolle", "breitengrad", "laengengrad", "bild_pfad", "baujahr", "hersteller", "status"]
-    if not os.path.exists(CSV_FILE):
-        pd.DataFrame(columns=cols).to_csv(CSV_FILE, index=False)
-        return pd.DataFrame(columns=cols)
-    try:
-        # Alles als String laden
-        df = pd.read_csv(CSV_FILE, dtype=str)
-    except:
-        return pd.DataFrame(columns=cols)
-
-    for col in cols:
-        if col not in df.columns: df[col] = ""
-    
-    # Status säubern
-    df["status"] = df["status"].fillna("Funktionstüchtig").replace(["nan", "Nan", "", "None"], "Funktionstüchtig").str.strip().str.capitalize()
-    
-    # Koordinaten mit safe_float reparieren
-    df["breitengrad"] = df["breitengrad"].apply(safe_float)
-    df["laengengrad"] = df["laengengrad"].apply(safe_float)
+    # st.cache_data liefert jeder Session eine eigene Kopie des normalisierten DataFrames.
+    # Die Version kennzeichnet den geladenen Stand (z.B. für den Umkreis-Index).
+    storage = get_storage()
+    with get_perf().timed("laden") as sample:
+        version = (storage.name, storage.signature())
+        df = _load_data_cached(*version)
+        sample["bytes"] = int(df.memory_usage(index=False).sum())
+    return df, version
 
-    text_cols = ["nummer", "bundesnummer", "plz", "strasse", "stadt", "typ", "bild_pfad", "baujahr", "hersteller"]
-    for col in text_cols:
-        df[col] = df[col].replace(["nan", "Nan"], "").astype(str)
-        
-    df["letzte_kontrolle"] = pd.to_datetime(df["letzte_kontrolle"], errors='coerce').dt.date
-    return df
-
-def save_data(df):
-    if "status" in df.columns:
-        df["status"] = df["status"].astype(str).str.strip().str.capitalize()
-    # Koordinaten als saubere Floats speichern
-    df["breitengrad"] = df["breitengrad"].apply(safe_float)
-    df["laengengrad"] = df["laengengrad"].apply(safe_float)
-    
-    df.to_csv(CSV_FILE, index=False)
+@st.cache_resource
+def get_spatial_index(kind):
+    return SpatialIndex()
+
+def spatial_index(df, version, defekt_only=False):
+    # Ein Index für alle, einer nur für defekte Standorte. Nach dem Speichern
+    # ändert sich die Version und sync fasst nur geänderte Standorte an.
+    index = get_spatial_index("defekt" if defekt_only else "alle")
+    index.sync(df[df["status"] == "Defekt"] if defekt_only else df, version=version)
+    return index
+
+def parse_origin(text, df):
+    # "52.51, 13.48", eine Standortnummer oder eine Adresse -> (lat, lon) oder None
+    text = (text or "").strip()
+    if not text: return None
+    parts = text.replace(";", ",").split(",")
+    if len(parts) == 2:
+        lat, lon = safe_float(parts[0]), safe_float(parts[1])
+        if lat != 0.0 and lon != 0.0: return lat, lon
+    hit = df[df["nummer"] == text]
+    if not hit.empty and safe_float(hit.iloc[0]["breitengrad"]) != 0.0:
+        return safe_float(hit.iloc[0]["breitengrad"]), safe_float(hit.iloc[0]["laengengrad"])
+    with get_perf().timed("geocoding"):
+        return geocode_cached(text if "," in text else f"{text}, Berlin", geocode, get_geocache())
+
+def _changed():
+    # Alte Einträge verwerfen, der nächste Rerun liest den neuen Stand
+    _load_data_cached.clear()
+
+def save_changes(upserts=None, deletes=(), expected=None, before=None, source="tabelle", inserts=None):
+    # Nur geänderte/neue/gelöschte Zeilen schreiben; expected = {id: etag} wie zuletzt gesehen.
+    # inserts: neue Zeilen, werden nur angelegt (vorhandene id -> ConflictError).
+    # before: die Zeilen, gegen die expected geprüft wurde -> Grundlage für den Verlauf
+    with get_perf().timed("speichern"):
+        get_storage().apply_changes(upserts, deletes, expected, inserts=inserts)
+    written = [df for df in (upserts, inserts) if df is not None and not df.empty]
+    if written:
+        written = pd.concat(written, ignore_index=True)
+        after = written.assign(status=normalize_status(written["status"]))
+        get_history().record(change_events(before, after), source=source)
+    _changed()
+
+@st.cache_resource
+def get_import_merger():
+    # Ein Hash-Index für alle Import-Jobs, wird nur bei fremden Änderungen neu gebaut
+    return ImportMerger(get_storage())
+
+def import_rows(rows):
+    # Import-Stück: vorhandene Standorte aktualisieren, nur wirklich neue anlegen
+    with get_perf().timed("speichern (import)"):
+        counts = get_import_merger().commit(rows)
+    _changed()
+    return counts
+
+def append_data(rows):
+    # Neue Zeilen anhängen (Neu-Formular) -> Anzahl geschriebener Zeilen.
+    # Schon vorhandene ids werden übersprungen, ein wiederholter Batch schadet nicht.
+    with get_perf().timed("speichern"):
+        added = get_storage().insert(rows)
+    _changed()
+    return added
 
-df = load_data()
+def update_entry(entry_id, expected=None, **fields):
+    # Einzelne Felder eines Standorts ändern (SQLite: ein UPDATE auf eine Zeile).
+    # Mit expected (etag der Zeile beim Anzeigen) gibt es ConflictError statt stillem Überschreiben.
+    # Für den Verlauf wird gegen genau die gelesene Zeile geprüft: der Vorher-Stand ist dann
+    # der überschriebene, der Nachher-Stand folgt aus ihm und den geschriebenen Feldern.
+    before = get_storage().get(entry_id) if set(fields) & {"status", "letzte_kontrolle"} else None
+    if before is not None:
+        before = before.to_frame().T
+        tag = row_etags(before)[str(entry_id)]
+        if expected is not None and expected != tag: raise ConflictError([entry_id])
+        expected = tag
+    with get_perf().timed("speichern"):
+        changed = get_storage().update(entry_id, fields, expected=expected)
+    if before is not None and changed:
+        after = before.assign(**fields)
+        after["status"] = normalize_status(after["status"])
+        get_history().record(change_events(before, after), source="schnell-update")
+    _changed()
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _overdue_cached(version, _df):
+    # Nur bei neuem Datenstand neu zählen (_df wird nicht gehasht)
+    return overdue_by_age(_df)
+
+def import_jobs_panel():
+    for job in list_jobs()[:5]:
+        skipped = job.get("skipped", 0)
+        # Vorhandene Standorte werden aktualisiert, nur neue angelegt (ImportMerger)
+        merged = f"{job.get('neu', 0)} neu · {job.get('aktualisiert', 0)} aktualisiert · {job.get('unveraendert', 0)} unverändert"
+        rate = f" · {job['rate']:,.0f} Zeilen/s" if job.get("rate") else ""
+        if job["status"] == JOB_RUNNING:
+            text = f"{job['filename']}: {job['done']} Zeilen gelesen · {merged} · {job['failed']} ohne Koordinaten · {skipped} übersprungen{rate}"
+            # Anteil der Datei (gelesene Bytes bzw. Zeilen des Blatts), siehe standort/jobs.py
+            if job.get("progress") is not None: st.progress(min(max(job["progress"], 0.0), 1.0), text=text)
+            else: st.info(text)
+        elif job["status"] == JOB_DONE:
+            st.success(f"{job['filename']}: {merged} ({job['geocoded']} geocodiert, {job['failed']} ohne Koordinaten, {skipped} leer/doppelt übersprungen){rate}")
+        else:
+            st.error(f"{job['filename']}: abgebrochen nach Zeile {job['done']} – {job['error']}")
+            if st.button("Fortsetzen", key=f"resume_{job['id']}"):
+                # False: fertig oder schon beansprucht, z.B. von einer anderen Sitzung/einem anderen Prozess
+                if resume_job(job["id"], geocode, get_geocache(), import_rows): st.rerun()
+                else: st.info(f"{job['filename']}: wird bereits fortgesetzt oder ist schon fertig.")
+
+df, data_version = load_data()
+# Nach einem Neustart unterbrochene Importe am letzten Checkpoint fortsetzen
+resume_jobs(geocode, get_geocache(), import_rows)
 
 
 # --- HEADER ---
@@ -218,7 +389,11 @@ with tab_home:
                 st.session_state.detail_id = None
                 st.rerun()
         
-        entry = df[df['id'] == st.session_state.detail_id].iloc[0]
+        entry = get_storage().get(st.session_state.detail_id)
+        if entry is None:
+            # Eintrag wurde inzwischen gelöscht
+            st.session_state.detail_id = None
+            st.rerun()
         status_raw = str(entry['status'])
         is_defekt = status_raw == "Defekt"
         
@@ -241,6 +416,12 @@ with tab_home:
             st.markdown(f"**Baujahr:** {entry['baujahr']}")
         with c2:
             st.markdown(f"**Kontrolle:** {entry['letzte_kontrolle']}")
+
+        events = get_history().timeline(entry['id'])
+        if not events.empty:
+            with st.expander(f"Verlauf · {get_history().failure_count(entry['id'])}× defekt gemeldet"):
+                events["ts"] = pd.to_datetime(events["ts"]).dt.strftime("%d.%m.%Y %H:%M")
+                st.dataframe(events.rename(columns={"ts": "Zeit", "field": "Feld", "old": "Vorher", "new": "Nachher", "source": "Quelle"}).iloc[::-1], hide_index=True, use_container_width=True)
             
         lat = safe_float(entry['breitengrad'])
         lon = safe_float(entry['laengengrad'])
@@ -250,18 +431,38 @@ with tab_home:
             m_icon = "exclamation-sign" if is_defekt else "ok-sign"
             m_detail = folium.Map(location=[lat, lon], zoom_start=16, tiles="OpenStreetMap")
             folium.Marker([lat, lon], icon=folium.Icon(color=m_color, icon=m_icon)).add_to(m_detail)
-            st_folium(m_detail, width="100%", height=250)
+            show_map(m_detail, "detail", width="100%", height=250)
         else:
             st.warning("⚠️ Keine GPS-Koordinaten hinterlegt.")
 
     else:
         # LISTE
-        mode = st.radio("Ansicht", ["Liste", "Karte"], horizontal=True, label_visibility="collapsed")
+        mode = st.radio("Ansicht", ["Liste", "Karte", "In der Nähe", "Route"], horizontal=True, label_visibility="collapsed")
         
         if mode == "Liste":
             if not df.empty:
-                df_display = df.sort_values(by='nummer', ascending=True)
-                for _, row in df_display.iterrows():
+                t_list, list_bytes = time.perf_counter(), 0
+                # FILTER (serverseitig, neue Filter -> zurück auf Seite 1)
+                f1, f2, f3 = st.columns(3)
+                f_status = f1.selectbox("Status", ["Alle", "Funktionstüchtig", "Defekt"], key="f_status", on_change=_reset_list_page)
+                f_plz = f2.selectbox("PLZ", ["Alle"] + sorted(p for p in df['plz'].unique() if p), key="f_plz", on_change=_reset_list_page)
+                f_her = f3.selectbox("Hersteller", ["Alle"] + sorted(h for h in df['hersteller'].unique() if h), key="f_her", on_change=_reset_list_page)
+                f_text = st.text_input("Suche", placeholder="🔍 Nummer, Bundesnummer oder Straße", key="f_text", label_visibility="collapsed", on_change=_reset_list_page)
+
+                df_filtered = filter_locations(
+                    df,
+                    status=None if f_status == "Alle" else f_status,
+                    plz=None if f_plz == "Alle" else f_plz,
+                    hersteller=None if f_her == "Alle" else f_her,
+                    text=f_text,
+                )
+                df_display = df_filtered.sort_values(by='nummer', ascending=True)
+                # Nur die aktuelle Seite rendern
+                df_page, st.session_state.list_page = page_slice(df_display, st.session_state.list_page, LIST_PAGE_SIZE)
+                n_pages = page_count(len(df_display), LIST_PAGE_SIZE)
+                st.caption(f"{len(df_display)} von {len(df)} Standorten")
+
+                for _, row in df_page.iterrows():
                     with st.container():
                         curr_stat = str(row['status'])
                         is_defekt = curr_stat == "Defekt"
@@ -277,37 +478,140 @@ with tab_home:
                         addr_text = f"{row['strasse']}<br>{row['plz']} {row['stadt']}".strip()
                         img_tag = ""
                         if row['bild_pfad'] and os.path.exists(row['bild_pfad']):
-                            b64 = get_image_base64(row['bild_pfad'])
+                            b64 = thumb_b64(row['bild_pfad'])
                             if b64:
                                 img_tag = f'<img src="data:image/jpeg;base64,{b64}" style="width:60px; height:60px; object-fit:cover; border-radius:6px; flex-shrink:0; margin-left:10px;">'
                         
                         html_code = f'<div style="display:flex; justify-content:space-between; align-items:center; margin-top:5px; padding:0 5px; width:100%;"><div style="font-size:13px; color:#666; line-height:1.3; flex-grow:1; word-wrap:break-word;">{addr_text}</div>{img_tag}</div>'
                         st.markdown(html_code, unsafe_allow_html=True)
+                        list_bytes += len(label) + len(html_code)
                     st.markdown("<hr>", unsafe_allow_html=True)
+                # Filtern, Seite schneiden und Karten der Seite (inkl. Bilder) bis hier
+                get_perf().record("liste", time.perf_counter() - t_list, list_bytes)
+
+                if n_pages > 1:
+                    p_prev, p_info, p_next = st.columns([1, 2, 1])
+                    p_prev.button("◀", key="page_prev", on_click=_change_list_page, args=(-1,), disabled=st.session_state.list_page == 0, use_container_width=True)
+                    p_info.markdown(f"<div style='text-align:center; padding-top:10px;'>Seite {st.session_state.list_page + 1} von {n_pages}</div>", unsafe_allow_html=True)
+                    p_next.button("▶", key="page_next", on_click=_change_list_page, args=(1,), disabled=st.session_state.list_page >= n_pages - 1, use_container_width=True)
             else:
                 st.info("Keine Einträge.")
 
         elif mode == "Karte":
-            m = folium.Map(location=st.session_state.map_center, zoom_start=st.session_state.map_zoom, tiles="OpenStreetMap")
-            valid_geo = df[(df['breitengrad'] != 0.0) & (df['laengengrad'] != 0.0)]
-            if st.session_state.map_zoom == 12 and not valid_geo.empty:
-                sw = valid_geo[['breitengrad', 'laengengrad']].min().values.tolist()
-                ne = valid_geo[['breitengrad', 'laengengrad']].max().values.tolist()
-                if sw != ne: m.fit_bounds([sw, ne])
-            for _, row in df.iterrows():
-                if row['breitengrad'] != 0.0 and row['laengengrad'] != 0.0:
-                    st_val = str(row['status'])
-                    is_defekt = st_val == "Defekt"
-                    c = "red" if is_defekt else "green"
-                    ic = "exclamation-sign" if is_defekt else "ok-sign"
-                    
-                    img_html = ""
-                    if row['bild_pfad'] and os.path.exists(row['bild_pfad']):
-                        b64 = get_image_base64(row['bild_pfad'])
-                        if b64: img_html = f'<img src="data:image/jpeg;base64,{b64}" style="width:100%; border-radius:6px; margin-bottom:5px;">'
-                    popup_content = f"<div style='width:160px; font-family:sans-serif;'>{img_html}<b>{row['nummer']}</b><br>{row['strasse']}<br>Status: <b>{st_val}</b></div>"
-                    folium.Marker([row['breitengrad'], row['laengengrad']], popup=folium.Popup(popup_content, max_width=200), icon=folium.Icon(color=c, icon=ic)).add_to(m)
-            st_folium(m, width="100%", height=600)
+            with get_perf().timed("karte aufbauen"):
+                m = folium.Map(location=st.session_state.map_center, zoom_start=st.session_state.map_zoom, tiles="OpenStreetMap")
+                valid_geo = geocoded(df)
+                if st.session_state.map_zoom == 12 and not valid_geo.empty:
+                    sw = valid_geo[['breitengrad', 'laengengrad']].min().values.tolist()
+                    ne = valid_geo[['breitengrad', 'laengengrad']].max().values.tolist()
+                    if sw != ne: m.fit_bounds([sw, ne])
+                # Ein Datenarray + Clustering im Browser statt eines Markers pro Standort
+                add_site_markers(m, valid_geo)
+            # Nur Klicks lösen einen Rerun aus, Verschieben/Zoomen nicht
+            map_state = show_map(m, "karte", width="100%", height=600, returned_objects=["last_object_clicked"])
+
+            # Foto und Details erst für den angeklickten Standort laden
+            clicked = (map_state or {}).get("last_object_clicked")
+            if clicked:
+                row = find_site_at(valid_geo, clicked.get("lat"), clicked.get("lng"))
+                if row is not None:
+                    is_defekt = str(row['status']) == "Defekt"
+                    c_info, c_img = st.columns([3, 1])
+                    with c_info:
+                        if st.button(f"{row['nummer']} - {row['bundesnummer']}", key=f"m_{row['id']}", type="primary" if is_defekt else "secondary", use_container_width=True):
+                            st.session_state.detail_id = row['id']
+                            st.rerun()
+                        st.markdown(f"<div style='font-size:13px; color:#666;'>{row['strasse']}<br>Status: <b>{row['status']}</b></div>", unsafe_allow_html=True)
+                    with c_img:
+                        b64 = thumb_b64(row['bild_pfad']) if row['bild_pfad'] else None
+                        if b64: st.markdown(f'<img src="data:image/jpeg;base64,{b64}" style="width:100%; border-radius:6px;">', unsafe_allow_html=True)
+
+
+        elif mode == "In der Nähe":
+            n_where, n_radius = st.columns([3, 2])
+            near_text = n_where.text_input("Standort", placeholder="📍 Adresse, Standortnummer oder Breite, Länge", key="near_text")
+            near_radius = n_radius.select_slider("Umkreis", options=[100, 250, 500, 1000, 2000, 5000], value=500, format_func=lambda r: f"{r} m" if r < 1000 else f"{r // 1000} km", key="near_radius")
+            near_defekt = st.checkbox("Nur defekte Standorte", key="near_defekt")
+            origin = parse_origin(near_text, df)
+            if near_text and origin is None:
+                st.warning("Adresse nicht gefunden.")
+            elif origin:
+                index = spatial_index(df, data_version, defekt_only=near_defekt)
+                hits = index.within(origin[0], origin[1], near_radius)
+                if hits:
+                    st.caption(f"{len(hits)} Standorte im Umkreis von {near_radius} m")
+                else:
+                    hits = index.nearest(origin[0], origin[1], k=5)
+                    st.caption("Keine Standorte im Umkreis – die nächsten:")
+                dist_by_id = dict(hits)
+                near_df = df[df["id"].astype(str).isin(dist_by_id)].copy()
+                near_df["entfernung"] = near_df["id"].astype(str).map(dist_by_id)
+                near_df = near_df.sort_values("entfernung")
+
+                m_near = folium.Map(location=list(origin), zoom_start=16 if near_radius <= 500 else 14, tiles="OpenStreetMap")
+                folium.Circle(list(origin), radius=near_radius, color="#0071e3", weight=1, fill=True, fill_opacity=0.05).add_to(m_near)
+                folium.CircleMarker(list(origin), radius=6, color="#0071e3", fill=True, fill_opacity=1).add_to(m_near)
+                add_site_markers(m_near, near_df)
+                show_map(m_near, "nähe", width="100%", height=400, returned_objects=[])
+
+                for _, row in near_df.head(LIST_PAGE_SIZE).iterrows():
+                    is_defekt = str(row['status']) == "Defekt"
+                    dist = row['entfernung']
+                    dist_text = f"{dist:.0f} m" if dist < 1000 else f"{dist / 1000:.1f} km"
+                    if st.button(f"{row['nummer']} - {row['bundesnummer']} · {dist_text}", key=f"n_{row['id']}", type="primary" if is_defekt else "secondary", use_container_width=True):
+                        st.session_state.detail_id = row['id']
+                        st.rerun()
+                    st.markdown(f"<div style='font-size:13px; color:#666; padding:0 5px;'>{row['strasse']}<br>{row['plz']} {row['stadt']}</div>", unsafe_allow_html=True)
+                    st.markdown("<hr>", unsafe_allow_html=True)
+                if len(near_df) > LIST_PAGE_SIZE:
+                    st.caption(f"Die nächsten {LIST_PAGE_SIZE} von {len(near_df)} werden angezeigt.")
+
+
+        elif mode == "Route":
+            r_start, r_techs = st.columns([3, 1])
+            route_start = r_start.text_input("Start", placeholder="📍 Startadresse, Standortnummer oder Breite, Länge", key="route_start")
+            route_techs = r_techs.number_input("Techniker", min_value=1, max_value=len(ROUTE_COLORS), value=1, key="route_techs")
+            r_def, r_due, r_days = st.columns([1, 1, 1])
+            route_defekt = r_def.checkbox("Defekte", value=True, key="route_defekt")
+            route_overdue = r_due.checkbox("Kontrolle überfällig", key="route_overdue")
+            route_days = r_days.number_input("Tage seit Kontrolle", min_value=1, value=OVERDUE_DAYS, key="route_days", disabled=not route_overdue)
+            stops = route_candidates(df, defekt=route_defekt, overdue_days=route_days if route_overdue else None)
+            st.caption(f"{len(stops)} Stopps mit Koordinaten")
+            if len(stops) > MAX_STOPS:
+                st.warning(f"Zu viele Stopps für eine Tour: geplant werden nur die {MAX_STOPS} dringendsten (Defekte, dann älteste Kontrolle). Filter enger fassen für den Rest.")
+                stops = most_urgent(stops)
+
+            if st.button("Route berechnen", key="route_calc", type="primary", use_container_width=True, disabled=stops.empty):
+                origin = parse_origin(route_start, df)
+                if origin is None:
+                    st.warning("Bitte einen gültigen Startpunkt angeben.")
+                else:
+                    with st.spinner("Route wird berechnet..."):
+                        routes = plan_routes(stops, origin, technicians=route_techs)
+                    # Nur ids merken; die Zeilen kommen beim Anzeigen aus dem aktuellen Stand
+                    st.session_state.route_plan = {"start": origin, "routes": [(r["id"].tolist(), meters) for r, meters in routes]}
+
+            plan = st.session_state.get("route_plan")
+            if plan:
+                by_id = df.set_index("id")
+                m_route = folium.Map(location=list(plan["start"]), zoom_start=13, tiles="OpenStreetMap")
+                folium.Marker(list(plan["start"]), icon=folium.Icon(color="black", icon="home")).add_to(m_route)
+                all_points = [list(plan["start"])]
+                route_frames = []
+                for n, (ids, meters) in enumerate(plan["routes"]):
+                    route_df = by_id.loc[[i for i in ids if i in by_id.index]].reset_index()
+                    route_frames.append((route_df, meters))
+                    add_route(m_route, route_df, plan["start"], ROUTE_COLORS[n % len(ROUTE_COLORS)])
+                    all_points += route_df[['breitengrad', 'laengengrad']].to_numpy(dtype=float).tolist()
+                lats, lons = [p[0] for p in all_points], [p[1] for p in all_points]
+                if len(all_points) > 1: m_route.fit_bounds([[min(lats), min(lons)], [max(lats), max(lons)]])
+                show_map(m_route, "route", width="100%", height=500, returned_objects=[])
+
+                for n, (route_df, meters) in enumerate(route_frames):
+                    with st.expander(f"Techniker {n + 1} · {len(route_df)} Stopps · {meters / 1000:.1f} km", expanded=len(route_frames) == 1):
+                        table = route_df[["nummer", "strasse", "plz", "status"]].copy()
+                        table.insert(0, "Nr", range(1, len(table) + 1))
+                        st.dataframe(table, hide_index=True, use_container_width=True)
 
 
 # --- TAB 2: VERWALTUNG ---
@@ -319,97 +623,84 @@ with tab_admin:
         selected_label = st.selectbox("Standort wählen:", list(entry_options.keys()))
         selected_id = entry_options[selected_label]
         
-        row_idx = df.index[df['id'] == selected_id].tolist()[0]
-        current_status = str(df.at[row_idx, 'status'])
+        current = get_storage().get(selected_id)
+        # Stand merken, den der Bearbeiter sieht; beim Speichern wird dagegen geprüft
+        seen = st.session_state.get("quick_seen", {}).get(str(selected_id))
+        current_tag = row_etags(current.to_frame().T)[str(selected_id)]
+        st.session_state.quick_seen = {str(selected_id): current_tag}
+        current_status = str(current['status'])
         idx_radio = 1 if current_status == "Defekt" else 0
         
         c_v1, c_v2 = st.columns(2)
         new_status = c_v1.radio("Status:", ["Funktionstüchtig", "Defekt"], index=idx_radio)
         
         # KOORDINATEN LESEN (MIT SAFE_FLOAT)
-        curr_lat = safe_float(df.at[row_idx, 'breitengrad'])
-        curr_lon = safe_float(df.at[row_idx, 'laengengrad'])
+        curr_lat = safe_float(current['breitengrad'])
+        curr_lon = safe_float(current['laengengrad'])
         
         new_lat = c_v2.number_input("Lat:", value=curr_lat, format="%.5f")
         new_lon = c_v2.number_input("Lon:", value=curr_lon, format="%.5f")
         
         if st.button("Speichern", key="save_admin", use_container_width=True):
-            df.at[row_idx, 'status'] = new_status
-            df.at[row_idx, 'breitengrad'] = new_lat
-            df.at[row_idx, 'laengengrad'] = new_lon
-            save_data(df)
-            st.success("Gespeichert!")
-            st.rerun()
+            try:
+                update_entry(selected_id, expected=seen or current_tag, status=new_status, breitengrad=new_lat, laengengrad=new_lon)
+            except ConflictError:
+                st.error("Der Standort wurde inzwischen von jemand anderem geändert. Bitte prüfen und erneut speichern.")
+            else:
+                st.success("Gespeichert!")
+                st.rerun()
     else:
         st.info("Keine Einträge.")
     st.markdown("</div>", unsafe_allow_html=True)
     st.markdown("<hr>", unsafe_allow_html=True)
 
-    # --- IMPORT (ROBUST) ---
+    # --- IMPORT (HINTERGRUND-JOB) ---
     with st.expander("📂 Datei importieren", expanded=False):
         uploaded_file = st.file_uploader("Datei", type=["ods", "xlsx", "csv"])
         
         if uploaded_file is not None:
             if st.button("Import jetzt starten", key="btn_import_start", type="secondary"):
-                status_placeholder = st.empty()
-                status_placeholder.info("Lese Datei...")
-                try:
-                    filename = uploaded_file.name.lower()
-                    if filename.endswith(".csv"): 
-                        df_new = pd.read_csv(uploaded_file, dtype=str)
-                    elif filename.endswith(".ods"): 
-                        df_new = pd.read_excel(uploaded_file, engine="odf", dtype=str)
-                    else: 
-                        df_new = pd.read_excel(uploaded_file, dtype=str)
-                    
-                    file_cols = [c.lower() for c in df_new.columns]
-                    def get_col(kws):
-                        for i, c in enumerate(file_cols):
-                            for kw in kws:
-                                if kw in c: return df_new.iloc[:, i]
-                        return None
-                    
-                    imp_nr = get_col(["nummer", "nr.", "standort"])
-                    imp_b = get_col(["bundes", "b-nr"])
-                    imp_s = get_col(["straße", "strasse", "adr"])
-                    imp_plz = get_col(["plz", "post"])
-                    imp_ort = get_col(["stadt", "ort", "bezirk"])
-                    imp_bau = get_col(["baujahr", "jahr"])
-                    imp_her = get_col(["hersteller", "firma"])
-                    
-                    count = 0
-                    for idx in range(len(df_new)):
-                        nid = pd.Timestamp.now().strftime('%Y%m%d') + f"{idx:04d}"
-                        v_nr = str(imp_nr.iloc[idx]) if imp_nr is not None else ""
-                        v_b = str(imp_b.iloc[idx]) if imp_b is not None else ""
-                        v_s = str(imp_s.iloc[idx]) if imp_s is not None else ""
-                        v_p = str(imp_plz.iloc[idx]) if imp_plz is not None else ""
-                        v_o = str(imp_ort.iloc[idx]) if imp_ort is not None else "Berlin"
-                        v_bau = str(imp_bau.iloc[idx]) if imp_bau is not None else ""
-                        v_her = str(imp_her.iloc[idx]) if imp_her is not None else ""
-                        if v_nr == "nan": v_nr = ""
-                        
-                        lat, lon = 0.0, 0.0
-                        try:
-                            loc = geocode(f"{v_s}, {v_p} {v_o}")
-                            if loc: lat, lon = loc.latitude, loc.longitude
-                        except: pass
-                        
-                        new_row = pd.DataFrame({"id": [nid], "nummer": [v_nr], "bundesnummer": [v_b], "strasse": [v_s], "plz": [v_p], "stadt": [v_o], "typ": ["Dialog Display"], "letzte_kontrolle": [datetime.date.today()], "breitengrad": [lat], "laengengrad": [lon], "bild_pfad": [""], "baujahr": [v_bau], "hersteller": [v_her], "status": ["Funktionstüchtig"]})
-                        df = pd.concat([df, new_row], ignore_index=True)
-                        count += 1
-                    
-                    save_data(df)
-                    status_placeholder.success(f"{count} Einträge erfolgreich importiert!")
-                    
-                except Exception as e:
-                    status_placeholder.error(f"Fehler: {e}")
+                # Läuft im Hintergrund weiter, auch wenn der Browser die Verbindung verliert
+                start_import_job(uploaded_file.getvalue(), uploaded_file.name, geocode, get_geocache(), import_rows)
+
+        jobs = list_jobs()[:5]
+        any_running = any(j["status"] == JOB_RUNNING for j in jobs)
+        st.fragment(run_every="2s" if any_running else None)(import_jobs_panel)()
+
+    # --- OFFLINE-PAKET ---
+    with st.expander("📦 Offline-Paket für Tablets", expanded=False):
+        st.caption(f"Karte, Liste und Vorschaubilder als ZIP zum Öffnen ohne Server. Ein neuer Export schreibt nur geänderte Dateien in {EXPORT_FOLDER}.")
+        if st.button("Paket aktualisieren", key="btn_export", use_container_width=True):
+            with st.spinner("Paket wird erstellt..."):
+                stats = export_bundle(df)
+                st.session_state.export_zip = bundle_zip()
+            st.success(f"{stats['standorte']} Standorte · {stats['dateien_geschrieben']} Datendateien neu, {stats['dateien_unveraendert']} unverändert · {stats['bilder_neu']} neue Bilder")
+            if not stats["karte"]:
+                st.warning("Leaflet konnte nicht geladen werden: das Paket zeigt nur die Liste. leaflet.js und leaflet.css nach standort/static/leaflet legen und erneut exportieren.")
+        if st.session_state.get("export_zip"):
+            st.download_button("⬇️ ZIP herunterladen", st.session_state.export_zip, file_name="standorte-offline.zip", mime="application/zip", use_container_width=True)
     
     st.markdown("<hr>", unsafe_allow_html=True)
     
     st.subheader("Datentabelle")
-    edit_data = df.copy()
+    t_filter, t_prev, t_info, t_next = st.columns([5, 1, 2, 1])
+    t_text = t_filter.text_input("Tabelle filtern", placeholder="🔍 Nummer, Bundesnummer oder Straße", key="t_text", label_visibility="collapsed", on_change=_reset_table_page)
+    # Nur ein Ausschnitt geht an den Editor, nicht der ganze Datenbestand
+    table_view = filter_locations(df, text=t_text)
+    table_part, st.session_state.table_page = page_slice(table_view, st.session_state.table_page, TABLE_PAGE_SIZE)
+    n_table_pages = page_count(len(table_view), TABLE_PAGE_SIZE)
+    t_prev.button("◀", key="table_prev", on_click=_change_table_page, args=(-1,), disabled=st.session_state.table_page == 0, use_container_width=True)
+    t_info.markdown(f"<div style='text-align:center; padding-top:8px;'>Seite {st.session_state.table_page + 1} von {n_table_pages} · {len(table_view)} Zeilen</div>", unsafe_allow_html=True)
+    t_next.button("▶", key="table_next", on_click=_change_table_page, args=(1,), disabled=st.session_state.table_page >= n_table_pages - 1, use_container_width=True)
+
+    edit_data = table_part.reset_index(drop=True)
     edit_data["Löschen?"] = False 
+    # Zeilen und Stand beim letzten Anzeigen: die Editor-Positionen und die Konfliktprüfung beziehen sich darauf
+    shown = st.session_state.get("table_shown")
+    table_seen = st.session_state.get("table_seen") or {}
+    current_tags = row_etags(table_part)
+    st.session_state.table_shown = edit_data[COLUMNS]
+    st.session_state.table_seen = current_tags
     column_cfg = {
         "Löschen?": st.column_config.CheckboxColumn("🗑️", width="small"),
         "id": None, "bild_pfad": None,
@@ -419,31 +710,72 @@ with tab_admin:
         "strasse": st.column_config.TextColumn("Str"), "breitengrad": st.column_config.NumberColumn("Lat", format="%.5f"), "laengengrad": st.column_config.NumberColumn("Lon", format="%.5f")
     }
     col_order = ["Löschen?", "status", "nummer", "bundesnummer", "strasse", "plz", "stadt", "breitengrad", "laengengrad"]
-    edited_df = st.data_editor(edit_data, column_config=column_cfg, num_rows="dynamic", use_container_width=True, hide_index=True, column_order=col_order)
+    st.data_editor(edit_data, column_config=column_cfg, num_rows="dynamic", use_container_width=True, hide_index=True, column_order=col_order, key="table_editor")
     if st.button("💾 Speichern", key="save_table", use_container_width=True):
-        rows_to_keep = edited_df[edited_df["Löschen?"] == False]
-        save_data(rows_to_keep.drop(columns=["Löschen?"]))
-        st.success("Gespeichert!")
-        st.rerun()
+        # Nur die im Editor geänderten, neuen und gelöschten Zeilen schreiben.
+        # Änderungen anderer an anderen Zeilen bleiben so erhalten.
+        shown = shown if shown is not None else st.session_state.table_shown
+        upserts, inserts, deletes = editor_changes(shown, st.session_state.get("table_editor") or {})
+        touched = [*upserts["id"].astype(str), *deletes]
+        expected = {i: table_seen.get(i, current_tags.get(i)) for i in touched if i in table_seen or i in current_tags}
+        try:
+            save_changes(upserts, deletes, expected, before=shown, inserts=inserts)
+        except ConflictError as e:
+            st.error(f"Inzwischen von jemand anderem geändert: {', '.join(e.ids)}. Tabelle neu laden und erneut speichern.")
+        else:
+            st.session_state.pop("table_editor", None)
+            st.success("Gespeichert!")
+            st.rerun()
     st.markdown("<hr>", unsafe_allow_html=True)
     
+    st.subheader("Auswertung")
+    # Liest nur vorberechnete Kennzahlen, nicht das Ereignisprotokoll
+    a_due, a_fail = st.columns(2)
+    with a_due:
+        st.markdown("**Letzte Kontrolle vor**")
+        st.bar_chart(_overdue_cached(data_version, df))
+    with a_fail:
+        fail_by = st.radio("Ausfälle nach", ["hersteller", "baujahr"], format_func=str.capitalize, horizontal=True, key="fail_by")
+        stats = get_history().failure_stats(fail_by)
+        if stats.empty:
+            st.caption("Noch keine Ausfälle protokolliert.")
+        else:
+            st.dataframe(stats.rename(columns={fail_by: fail_by.capitalize(), "ausfaelle": "Ausfälle", "mtbf_tage": "MTBF (Tage)"}), hide_index=True, use_container_width=True)
+    st.markdown("<hr>", unsafe_allow_html=True)
+
     st.subheader("Bild ändern")
     if not df.empty:
         opts = {f"{r['nummer']}": r['id'] for i, r in df.sort_values('nummer').iterrows()}
         sel_label = st.selectbox("Eintrag (für Foto):", opts.keys())
         sel_id = opts[sel_label]
-        curr = df[df['id'] == sel_id].iloc[0]
+        curr = get_storage().get(sel_id)
         if curr['bild_pfad'] and os.path.exists(curr['bild_pfad']): st.image(curr['bild_pfad'], width=150)
         up = st.file_uploader("Foto", type=['jpg','png'])
         if st.button("Foto speichern", key="save_photo", use_container_width=True):
             if up:
                 np = save_uploaded_image(up, sel_id)
-                idx = df.index[df['id'] == sel_id].tolist()[0]
-                df.at[idx, 'bild_pfad'] = np
-                save_data(df)
+                update_entry(sel_id, bild_pfad=np)
                 st.success("Gespeichert!")
                 st.rerun()
 
+    # --- LEISTUNG ---
+    with st.expander("⏱️ Leistung", expanded=False):
+        st.caption(f"Dauer je Schritt über die letzten {get_perf().maxlen} Messungen aller Sitzungen; 'rerun' ist der ganze Seitenaufbau.")
+        st.checkbox("Größe des Karten-HTML messen (rendert jede Karte ein zweites Mal)", key="perf_sizes")
+        perf = get_perf().summary()
+        if perf.empty:
+            st.caption("Noch keine Messungen.")
+        else:
+            perf[["bytes_mittel", "bytes_max"]] = perf[["bytes_mittel", "bytes_max"]] / 1024
+            st.dataframe(
+                perf.rename(columns={"schritt": "Schritt", "anzahl": "Anzahl", "p50_ms": "p50 [ms]", "p90_ms": "p90 [ms]", "p99_ms": "p99 [ms]", "max_ms": "max [ms]", "bytes_mittel": "Ø [KB]", "bytes_max": "max [KB]"}),
+                hide_index=True, use_container_width=True,
+                column_config={c: st.column_config.NumberColumn(format="%.1f") for c in ["p50 [ms]", "p90 [ms]", "p99 [ms]", "max [ms]", "Ø [KB]", "max [KB]"]},
+            )
+        if st.button("Messungen zurücksetzen", key="perf_reset"):
+            get_perf().reset()
+            st.rerun()
+
 
 # --- TAB 3: NEU ---
 with tab_new:
@@ -470,14 +802,19 @@ with tab_new:
         letzte_kontrolle = c_dat.date_input("Datum", datetime.date.today())
         if st.form_submit_button("Speichern", type="primary", use_container_width=True):
             final_lat, final_lon = 0.0, 0.0
-            new_id = pd.Timestamp.now().strftime('%Y%m%d%H%M%S')
+            new_id = new_site_id()
             img_path = save_uploaded_image(uploaded_img, new_id) if uploaded_img else ""
             if mlat != 0.0: final_lat, final_lon = mlat, mlon
             else:
-                try:
-                    loc = geocode(f"{strasse}, {plz} {stadt}")
-                    if loc: final_lat, final_lon = loc.latitude, loc.longitude
-                except: pass
+                with get_perf().timed("geocoding"):
+                    coords = geocode_cached(f"{strasse}, {plz} {stadt}", geocode, get_geocache())
+                if coords: final_lat, final_lon = coords
             new_row = pd.DataFrame({"id": [new_id], "nummer": [nummer], "bundesnummer": [bundesnummer], "strasse": [strasse], "plz": [plz], "stadt": [stadt], "typ": [typ], "letzte_kontrolle": [letzte_kontrolle], "breitengrad": [final_lat], "laengengrad": [final_lon], "bild_pfad": [img_path], "hersteller": [hersteller], "baujahr": [baujahr], "status": [status_input]})
-            save_data(pd.concat([df, new_row], ignore_index=True))
-            st.success("Gespeichert!")
+            if append_data(new_row):
+                get_history().record(change_events(None, new_row), source="neu")
+                st.success("Gespeichert!")
+            else:
+                st.error("Der Eintrag wurde nicht gespeichert (id schon vergeben). Bitte erneut speichern.")
+
+# Ganzer Rerun (ohne Reruns, die per st.rerun() abgebrochen wurden)
+get_perf().record("rerun", time.perf_counter() - _rerun_t0)
@@ -0,0 +1,126 @@
+"""Vergleicht den alten Import (pd.concat pro Zeile, .iloc pro Zelle) mit dem spaltenweisen Import.
+
+Aufruf:  python benchmarks/bench_import.py [--rows 2000 10000] [--formats csv xlsx ods]
+
+Geocodiert wird mit einem lokalen Stub, gemessen wird nur das Einlesen und
+der Aufbau der Zeilen. Der alte Pfad wird ab --legacy-max Zeilen übersprungen.
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from standort.geocache import GeoCache, geocode_many  # noqa: E402
+from standort.importer import build_rows, extract_fields, import_addresses, read_table  # noqa: E402
+from standort.normalize import COLUMNS  # noqa: E402
+
+
+class _Location:
+    def __init__(self, lat, lon):
+        self.latitude, self.longitude = lat, lon
+
+
+def stub_geocoder(address):
+    # deterministisch, ohne Netz
+    h = hash(address) % 10_000
+    return _Location(52.45 + h / 100_000, 13.45 + h / 100_000)
+
+
+def write_synthetic_table(path, rows, seed=1):
+    rng = random.Random(seed)
+    df = pd.DataFrame({
+        "Nummer": [f"LI-{i:05d}" for i in range(rows)],
+        "Bundesnummer": [f"B{rng.randint(1, 9999)}" for _ in range(rows)],
+        "Straße": [f"Teststraße {rng.randint(1, 300)}" for _ in range(rows)],
+        "PLZ": [str(rng.choice([10315, 10317, 10365, 10367, 13053])) for _ in range(rows)],
+        "Stadt": ["Berlin"] * rows,
+        "Baujahr": [str(rng.randint(1995, 2022)) for _ in range(rows)],
+        "Hersteller": [rng.choice(["Wall", "JCDecaux", "Ströer"]) for _ in range(rows)],
+    })
+    if path.endswith(".csv"): df.to_csv(path, index=False)
+    elif path.endswith(".ods"): df.to_excel(path, index=False, engine="odf")
+    else: df.to_excel(path, index=False)
+
+
+def legacy_import(df, df_new, geocode):
+    # Stand vor dem Umbau, 1:1 aus dem Import-Button übernommen (ohne UI)
+    file_cols = [c.lower() for c in df_new.columns]
+    def get_col(kws):
+        for i, c in enumerate(file_cols):
+            for kw in kws:
+                if kw in c: return df_new.iloc[:, i]
+        return None
+    imp_nr = get_col(["nummer", "nr.", "standort"])
+    imp_b = get_col(["bundes", "b-nr"])
+    imp_s = get_col(["straße", "strasse", "adr"])
+    imp_plz = get_col(["plz", "post"])
+    imp_ort = get_col(["stadt", "ort", "bezirk"])
+    imp_bau = get_col(["baujahr", "jahr"])
+    imp_her = get_col(["hersteller", "firma"])
+    for idx in range(len(df_new)):
+        nid = pd.Timestamp.now().strftime('%Y%m%d') + f"{idx:04d}"
+        v_nr = str(imp_nr.iloc[idx]) if imp_nr is not None else ""
+        v_b = str(imp_b.iloc[idx]) if imp_b is not None else ""
+        v_s = str(imp_s.iloc[idx]) if imp_s is not None else ""
+        v_p = str(imp_plz.iloc[idx]) if imp_plz is not None else ""
+        v_o = str(imp_ort.iloc[idx]) if imp_ort is not None else "Berlin"
+        v_bau = str(imp_bau.iloc[idx]) if imp_bau is not None else ""
+        v_her = str(imp_her.iloc[idx]) if imp_her is not None else ""
+        if v_nr == "nan": v_nr = ""
+        lat, lon = 0.0, 0.0
+        loc = geocode(f"{v_s}, {v_p} {v_o}")
+        if loc: lat, lon = loc.latitude, loc.longitude
+        new_row = pd.DataFrame({"id": [nid], "nummer": [v_nr], "bundesnummer": [v_b], "strasse": [v_s], "plz": [v_p], "stadt": [v_o], "typ": ["Dialog Display"], "letzte_kontrolle": [datetime.date.today()], "breitengrad": [lat], "laengengrad": [lon], "bild_pfad": [""], "baujahr": [v_bau], "hersteller": [v_her], "status": ["Funktionstüchtig"]})
+        df = pd.concat([df, new_row], ignore_index=True)
+    return df
+
+
+def columnar_import(df, df_new, geocode, geocache):
+    fields = extract_fields(df_new)
+    coords, _ = geocode_many(import_addresses(fields), geocode, geocache)
+    rows = build_rows(fields, 0, len(fields), coords, pd.Timestamp.now().strftime('%Y%m%d'))
+    return pd.concat([df, rows], ignore_index=True)
+
+
+def run(rows_list, formats, legacy_max):
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'Format':>6} {'Zeilen':>8} {'lesen [s]':>10} {'alt [s]':>9} {'neu [s]':>9} {'Faktor':>8}")
+        for fmt in formats:
+            for rows in rows_list:
+                path = os.path.join(tmp, f"import_{rows}.{fmt}")
+                write_synthetic_table(path, rows)
+                t0 = time.perf_counter()
+                df_new = read_table(path, path)
+                t_read = time.perf_counter() - t0
+
+                base = pd.DataFrame(columns=COLUMNS)
+                geocache = GeoCache(os.path.join(tmp, f"geo_{fmt}_{rows}.sqlite"))
+                t0 = time.perf_counter()
+                new = columnar_import(base, df_new, stub_geocoder, geocache)
+                t_new = time.perf_counter() - t0
+                geocache.close()
+                assert len(new) == rows
+
+                if rows <= legacy_max:
+                    t0 = time.perf_counter()
+                    old = legacy_import(base, df_new, stub_geocoder)
+                    t_old = time.perf_counter() - t0
+                    assert old["nummer"].tolist() == new["nummer"].tolist()
+                    print(f"{fmt:>6} {rows:>8} {t_read:>10.2f} {t_old:>9.2f} {t_new:>9.2f} {t_old / t_new:>7.0f}x")
+                else:
+                    print(f"{fmt:>6} {rows:>8} {t_read:>10.2f} {'-':>9} {t_new:>9.2f} {'-':>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[2_000, 10_000])
+    parser.add_argument("--formats", nargs="+", default=["csv", "xlsx", "ods"], choices=["csv", "xlsx", "ods"])
+    parser.add_argument("--legacy-max", type=int, default=10_000, help="alten Pfad nur bis zu dieser Zeilenzahl messen")
+    args = parser.parse_args()
+    run(args.rows, args.formats, args.legacy_max)
@@ -0,0 +1,126 @@
+"""Vergleicht die alte Normalisierung (safe_float per .apply) mit normalize_frame.
+
+Neben dem Ganzen wird jeder Schritt einzeln gemessen (Status, Texte,
+Koordinaten, Datum), jeweils alt gegen neu auf denselben Spalten. Ist das
+Ganze nicht schneller oder ein Schritt um mehr als --tolerance langsamer,
+endet das Skript mit einem AssertionError.
+
+Aufruf:  python benchmarks/bench_normalize.py [--rows 10000 100000] [--tolerance 1.25]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from standort.normalize import COLUMNS, TEXT_COLUMNS, normalize_frame, normalize_status, normalize_text, parse_coords, parse_dates, safe_float  # noqa: E402
+
+
+def legacy_normalize(df):
+    # Stand vor dem Umbau, 1:1 aus load_data() übernommen
+    for col in COLUMNS:
+        if col not in df.columns: df[col] = ""
+    df["status"] = df["status"].fillna("Funktionstüchtig").replace(["nan", "Nan", "", "None"], "Funktionstüchtig").str.strip().str.capitalize()
+    df["breitengrad"] = df["breitengrad"].apply(safe_float)
+    df["laengengrad"] = df["laengengrad"].apply(safe_float)
+    text_cols = ["nummer", "bundesnummer", "plz", "strasse", "stadt", "typ", "bild_pfad", "baujahr", "hersteller"]
+    for col in text_cols:
+        df[col] = df[col].replace(["nan", "Nan"], "").astype(str)
+    df["letzte_kontrolle"] = pd.to_datetime(df["letzte_kontrolle"], errors='coerce').dt.date
+    return df
+
+
+# Schritt -> (alt, neu), beide auf dem frisch gelesenen DataFrame
+STEPS = {
+    "status": (
+        lambda df: df["status"].fillna("Funktionstüchtig").replace(["nan", "Nan", "", "None"], "Funktionstüchtig").str.strip().str.capitalize(),
+        lambda df: normalize_status(df["status"])),
+    "texte (9 Spalten)": (
+        lambda df: [df[col].replace(["nan", "Nan"], "").astype(str) for col in TEXT_COLUMNS],
+        lambda df: [normalize_text(df[col]) for col in TEXT_COLUMNS]),
+    "koordinaten (2 Spalten)": (
+        lambda df: [df[col].apply(safe_float) for col in ("breitengrad", "laengengrad")],
+        lambda df: [parse_coords(df[col]) for col in ("breitengrad", "laengengrad")]),
+    "datum": (
+        lambda df: pd.to_datetime(df["letzte_kontrolle"], errors='coerce').dt.date,
+        lambda df: parse_dates(df["letzte_kontrolle"])),
+}
+
+
+def _coord(rng, lo, hi):
+    r = rng.random()
+    if r < 0.02: return ""
+    if r < 0.03: return "k.A."
+    val = rng.uniform(lo, hi)
+    # gemischt: deutsches Komma und Punkt
+    return f"{val:.6f}".replace(".", ",") if r < 0.5 else f"{val:.6f}"
+
+
+def write_synthetic_csv(path, rows, seed=1):
+    rng = random.Random(seed)
+    data = {
+        "id": [f"2024{i:08d}" for i in range(rows)],
+        "nummer": [f"LI-{i:05d}" for i in range(rows)],
+        "bundesnummer": [f"B{rng.randint(1, 9999)}" if rng.random() > 0.1 else "" for _ in range(rows)],
+        "strasse": [f"Teststraße {rng.randint(1, 200)}" for _ in range(rows)],
+        "plz": [str(rng.choice([10315, 10317, 10365, 10367, 13053])) for _ in range(rows)],
+        "stadt": ["Berlin"] * rows,
+        "typ": ["Dialog Display"] * rows,
+        "letzte_kontrolle": [f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}" for _ in range(rows)],
+        "breitengrad": [_coord(rng, 52.45, 52.58) for _ in range(rows)],
+        "laengengrad": [_coord(rng, 13.45, 13.56) for _ in range(rows)],
+        "bild_pfad": [""] * rows,
+        "baujahr": [str(rng.randint(1995, 2022)) for _ in range(rows)],
+        "hersteller": [rng.choice(["Wall", "JCDecaux", "Ströer", ""]) for _ in range(rows)],
+        "status": [rng.choice(["Funktionstüchtig", "defekt", " Defekt ", "", "nan"]) for _ in range(rows)],
+    }
+    pd.DataFrame(data).to_csv(path, index=False)
+
+
+def _best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def run(rows_list, repeat=3, tolerance=1.25):
+    # Die alte Fassung warnt unter pandas 2 bei replace (Downcasting)
+    warnings.simplefilter("ignore", FutureWarning)
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'Zeilen':>8} {'Schritt':<24} {'alt [ms]':>10} {'neu [ms]':>10} {'Faktor':>7}")
+        for rows in rows_list:
+            path = os.path.join(tmp, f"locations_{rows}.csv")
+            write_synthetic_csv(path, rows)
+            raw = pd.read_csv(path, dtype=str)
+            t_old, old = _best_of(lambda: legacy_normalize(raw.copy()), repeat)
+            t_new, new = _best_of(lambda: normalize_frame(raw.copy()), repeat)
+            for col in ("breitengrad", "laengengrad"):
+                # bitgleich inkl. NaN für leere Zellen und 0.0 für Müll
+                assert np.array_equal(old[col].to_numpy(), new[col].to_numpy(), equal_nan=True), col
+            assert old["status"].equals(new["status"])
+            assert old["letzte_kontrolle"].astype(str).equals(new["letzte_kontrolle"].astype(str))
+            for step, (old_fn, new_fn) in STEPS.items():
+                s_old, _ = _best_of(lambda: old_fn(raw), repeat)
+                s_new, _ = _best_of(lambda: new_fn(raw), repeat)
+                print(f"{rows:>8} {step:<24} {s_old * 1000:>10.1f} {s_new * 1000:>10.1f} {s_old / s_new:>6.1f}x")
+                assert s_new <= s_old * tolerance, f"{step} bei {rows} Zeilen langsamer als vorher"
+            print(f"{rows:>8} {'gesamt (normalize_frame)':<24} {t_old * 1000:>10.1f} {t_new * 1000:>10.1f} {t_old / t_new:>6.1f}x")
+            assert t_new < t_old, f"normalize_frame bei {rows} Zeilen nicht schneller als vorher"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=1.25, help="erlaubter Faktor je Schritt gegenüber alt")
+    args = parser.parse_args()
+    run(args.rows, args.repeat, args.tolerance)
@@ -0,0 +1,52 @@
+"""Misst die Tourenplanung (Matrix, Nächster Nachbar, 2-opt, Aufteilung) für viele Stopps.
+
+Aufruf:  python benchmarks/bench_routing.py [--stops 500 1000 3000] [--technicians 1 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from standort.routing import distance_matrix, nearest_neighbour, path_length, plan_routes, two_opt  # noqa: E402
+
+START = (52.515, 13.48)
+
+
+def synthetic_stops(n, seed=1):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "id": [str(i) for i in range(n)],
+        "breitengrad": 52.45 + rng.random(n) * 0.15,
+        "laengengrad": 13.40 + rng.random(n) * 0.20,
+    })
+
+
+def run(stops_list, technicians_list, time_limit=5.0):
+    print(f"{'Stopps':>7} {'Techn.':>6} {'Zeit [s]':>9} {'NN [km]':>8} {'2-opt [km]':>11} {'Touren [km]':>20}")
+    for n in stops_list:
+        stops = synthetic_stops(n)
+        lat = np.concatenate([[START[0]], stops["breitengrad"].to_numpy()])
+        lon = np.concatenate([[START[1]], stops["laengengrad"].to_numpy()])
+        dist = distance_matrix(lat, lon)
+        nn = nearest_neighbour(dist)
+        opt = two_opt(nn, dist, time_limit)
+        for techs in technicians_list:
+            t0 = time.perf_counter()
+            routes = plan_routes(stops, START, techs, time_limit)
+            elapsed = time.perf_counter() - t0
+            assert sorted(i for r, _ in routes for i in r["id"]) == sorted(stops["id"])
+            lengths = "/".join(f"{m / 1000:.0f}" for _, m in routes)
+            print(f"{n:>7} {techs:>6} {elapsed:>9.2f} {path_length(nn, dist) / 1000:>8.0f} {path_length(opt, dist) / 1000:>11.0f} {lengths:>20}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stops", type=int, nargs="+", default=[500, 1000, 3000])
+    parser.add_argument("--technicians", type=int, nargs="+", default=[1, 3])
+    parser.add_argument("--time-limit", type=float, default=5.0)
+    args = parser.parse_args()
+    run(args.stops, args.technicians, args.time_limit)
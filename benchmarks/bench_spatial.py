@@ -0,0 +1,80 @@
+"""Vergleicht Umkreis-/Nächste-Abfragen über SpatialIndex mit einem Scan über alle Zeilen.
+
+Aufruf:  python benchmarks/bench_spatial.py [--rows 10000 100000] [--queries 1000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from standort.spatial import SpatialIndex, haversine_m  # noqa: E402
+
+
+def synthetic_sites(rows, seed=1):
+    # Gleichmäßig über Lichtenberg und Umgebung verteilt (ca. 17 x 14 km)
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "id": [str(i) for i in range(rows)],
+        "breitengrad": 52.45 + rng.random(rows) * 0.15,
+        "laengengrad": 13.40 + rng.random(rows) * 0.20,
+        "status": np.where(rng.random(rows) < 0.1, "Defekt", "Funktionstüchtig"),
+    })
+
+
+def scan_within(df, lat, lon, radius_m):
+    dist = haversine_m(lat, lon, df["breitengrad"].to_numpy(), df["laengengrad"].to_numpy())
+    hit = np.flatnonzero(dist <= radius_m)
+    return df["id"].to_numpy()[hit[np.argsort(dist[hit], kind="stable")]].tolist()
+
+
+def scan_nearest(df, lat, lon, k):
+    dist = haversine_m(lat, lon, df["breitengrad"].to_numpy(), df["laengengrad"].to_numpy())
+    return df["id"].to_numpy()[np.argsort(dist, kind="stable")[:k]].tolist()
+
+
+def _per_query(fn, queries):
+    t0 = time.perf_counter()
+    results = [fn(lat, lon) for lat, lon in queries]
+    return (time.perf_counter() - t0) / len(queries), results
+
+
+def run(rows_list, n_queries=1000, radius_m=500, k=5):
+    rng = np.random.default_rng(2)
+    print(f"{'Zeilen':>8} {'Aufbau [ms]':>12} {'Umkreis [ms]':>13} {'Scan [ms]':>10} {'Nächste [ms]':>13} {'Scan [ms]':>10} {'sync 1 [ms]':>12}")
+    for rows in rows_list:
+        df = synthetic_sites(rows)
+        queries = list(zip(52.45 + rng.random(n_queries) * 0.15, 13.40 + rng.random(n_queries) * 0.20))
+        index = SpatialIndex()
+        t0 = time.perf_counter()
+        index.sync(df, version=1)
+        t_build = time.perf_counter() - t0
+
+        t_within, hits = _per_query(lambda lat, lon: index.within(lat, lon, radius_m), queries)
+        t_knn, nearest = _per_query(lambda lat, lon: index.nearest(lat, lon, k), queries)
+        few = queries[:50]
+        t_scan_within, scan_hits = _per_query(lambda lat, lon: scan_within(df, lat, lon, radius_m), few)
+        t_scan_knn, scan_near = _per_query(lambda lat, lon: scan_nearest(df, lat, lon, k), few)
+        assert [[i for i, _ in h] for h in hits[:50]] == scan_hits
+        assert [[i for i, _ in h] for h in nearest[:50]] == scan_near
+
+        # Ein gespeicherter Standort mit neuen Koordinaten
+        moved = df.copy()
+        moved.loc[rows // 2, "breitengrad"] += 0.01
+        t0 = time.perf_counter()
+        assert index.sync(moved, version=2) == 1
+        t_sync = time.perf_counter() - t0
+        print(f"{rows:>8} {t_build * 1000:>12.1f} {t_within * 1000:>13.3f} {t_scan_within * 1000:>10.3f} {t_knn * 1000:>13.3f} {t_scan_knn * 1000:>10.3f} {t_sync * 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--radius", type=float, default=500)
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+    run(args.rows, args.queries, args.radius, args.k)
@@ -0,0 +1,51 @@
+"""Misst die Startzeit der Kommandozeile und zum Vergleich die Importkosten der App-Abhängigkeiten.
+
+Jeder Befehl läuft als eigener Prozess (kalter Interpreter), gezeigt wird der beste von --repeat Läufen.
+
+Aufruf:  python benchmarks/bench_startup.py [--repeat 5]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = [
+    ("python -c pass", ["-c", "pass"]),
+    ("python -m standort --help", ["-m", "standort", "--help"]),
+    ("python -m standort stats (leer)", ["-m", "standort", "stats"]),
+    ("import pandas", ["-c", "import pandas"]),
+    ("import geopy (Nominatim)", ["-c", "from geopy.geocoders import Nominatim"]),
+    ("import folium", ["-c", "import folium"]),
+    ("import streamlit", ["-c", "import streamlit"]),
+]
+
+
+def _best_of(argv, repeat, cwd):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        proc = subprocess.run([sys.executable, *argv], cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        elapsed = time.perf_counter() - t0
+        if proc.returncode != 0: return None
+        best = min(best, elapsed)
+    return best
+
+
+def run(repeat=5):
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'Befehl':<34} {'Zeit [ms]':>10}")
+        for label, argv in CASES:
+            best = _best_of(argv, repeat, tmp)
+            print(f"{label:<34} {'nicht installiert' if best is None else f'{best * 1000:.0f}':>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.repeat)
@@ -0,0 +1,80 @@
+"""Vergleicht Spitzenspeicher und Durchsatz: ganze Datei einlesen (read_table) gegen stückweises Lesen (iter_fields).
+
+Jede Messung läuft in einem eigenen Prozess, gezeigt wird dessen maximaler
+Speicher (VmHWM) und der Durchsatz in Zeilen/s für Einlesen, Zuordnen,
+Prüfen und Zeilenaufbau (ohne Geocodierung und Speichern).
+
+Aufruf:  python benchmarks/bench_stream.py [--rows 10000 50000] [--formats csv xlsx ods]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+
+def _peak_mb():
+    # VmHWM gilt ab exec; ru_maxrss würde den Speicher des Elternprozesses mitzählen
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"): return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure(mode, path, chunksize):
+    # Im Kindprozess: Datei verarbeiten, Zeilen und Sekunden ausgeben
+    import pandas as pd
+
+    from standort.importer import build_rows, extract_fields, iter_fields, read_table
+    id_prefix = pd.Timestamp.now().strftime('%Y%m%d')
+    t0 = time.perf_counter()
+    rows = 0
+    if mode == "ganz":
+        fields = extract_fields(read_table(path, path))
+        rows = len(build_rows(fields, 0, len(fields), [None] * len(fields), id_prefix))
+    else:
+        for fields, _ in iter_fields(path, path, chunksize):
+            rows += len(build_rows(fields, 0, len(fields), [None] * len(fields), id_prefix))
+    elapsed = time.perf_counter() - t0
+    print(rows, elapsed, _peak_mb())
+
+
+def _child(mode, path, chunksize):
+    proc = subprocess.run([sys.executable, __file__, "--child", mode, path, str(chunksize)], capture_output=True, text=True, check=True)
+    rows, elapsed, peak = proc.stdout.split()
+    return int(rows), float(elapsed), float(peak)
+
+
+def run(rows_list, formats, chunksize):
+    from bench_import import write_synthetic_table
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'Format':>6} {'Zeilen':>8} {'Modus':>8} {'Zeit [s]':>9} {'Zeilen/s':>10} {'Speicher [MB]':>14}")
+        for fmt in formats:
+            for rows in rows_list:
+                path = os.path.join(tmp, f"import_{rows}.{fmt}")
+                write_synthetic_table(path, rows)
+                for mode in ("ganz", "stückweise"):
+                    n, elapsed, mb = _child(mode, path, chunksize)
+                    assert n == rows
+                    print(f"{fmt:>6} {rows:>8} {mode:>8} {elapsed:>9.2f} {n / elapsed:>10,.0f} {mb:>14.0f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        _measure(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+        sys.exit(0)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 50_000])
+    parser.add_argument("--formats", nargs="+", default=["csv", "xlsx", "ods"], choices=["csv", "xlsx", "ods"])
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    args = parser.parse_args()
+    run(args.rows, args.formats, args.chunk_size)
@@ -0,0 +1,194 @@
+"""Benchmark-Suite für die teuren Pfade der App mit erzeugten Beständen (1k/10k/100k Standorte).
+
+Gemessen werden dieselben Funktionen, die app.py je Rerun aufruft: Laden
+(SQLite/CSV), Liste (Filtern, Seite, Vorschaubilder), Karte aufbauen und als
+HTML rendern (das serialisiert st_folium), Umkreissuche, Speichern, Import und
+Geocodierung (lokaler Stub, kein Netz). Alles läuft in einem temporären
+Verzeichnis, data/ des Projekts bleibt unberührt.
+
+Aufruf:  python benchmarks/run_all.py [--sites 1000 10000 100000] [--images 200]
+                                      [--json ergebnis.json] [--compare basis.json]
+
+Mit --compare wird je Schritt der Median mit einer früheren --json-Datei
+verglichen; ist einer um mehr als --tolerance langsamer, endet das Skript mit 1.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_import import stub_geocoder, write_synthetic_table  # noqa: E402
+from bench_normalize import write_synthetic_csv  # noqa: E402
+
+from standort.filters import filter_locations, page_slice  # noqa: E402
+from standort.geocache import GeoCache, geocode_many  # noqa: E402
+from standort.importer import build_rows, import_addresses, iter_fields, new_id_prefix  # noqa: E402
+from standort.mapview import add_site_markers, geocoded  # noqa: E402
+from standort.matching import ImportMerger  # noqa: E402
+from standort.perf import PerfLog  # noqa: E402
+from standort.spatial import SpatialIndex  # noqa: E402
+from standort.storage import CsvStorage, SqliteStorage, row_etags  # noqa: E402
+from standort.thumbs import ensure_thumbnail, thumbnail_base64  # noqa: E402
+
+PAGE_SIZE = 25  # wie LIST_PAGE_SIZE in app.py
+GEOCODE_ADDRESSES = 2_000  # Adressen für die Geocodier-Schritte (höchstens so viele wie Standorte)
+
+
+def write_images(folder, count, seed=1):
+    # Fotos in Handygröße mit etwas Struktur, damit JPEG nicht trivial klein wird
+    from PIL import Image
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(count):
+        noise = rng.integers(0, 255, (150, 200, 3), dtype=np.uint8)
+        path = os.path.join(folder, f"foto_{i:05d}.jpg")
+        Image.fromarray(noise).resize((1600, 1200)).save(path, "JPEG", quality=85)
+        paths.append(path)
+    return paths
+
+
+def build_dataset(sites, images):
+    # locations.csv + locations.sqlite mit gleichem Inhalt; jeder zehnte Standort hat ein Foto
+    os.makedirs("data", exist_ok=True)
+    write_synthetic_csv("data/locations.csv", sites)
+    csv = CsvStorage("data/locations.csv")
+    df = csv.load()
+    photos = write_images("data/images", images) if images else []
+    if photos:
+        with_photo = np.arange(0, sites, 10)
+        df.loc[with_photo, "bild_pfad"] = [photos[i % len(photos)] for i in range(len(with_photo))]
+    csv.replace_all(df)
+    sqlite = SqliteStorage("data/locations.sqlite", migrate_from=None)
+    sqlite.replace_all(df)
+    return df, csv, sqlite
+
+
+def _repeat(perf, stage, fn, repeat):
+    for _ in range(repeat):
+        with perf.timed(stage) as sample:
+            sample["bytes"] = fn()
+
+
+def bench_size(sites, images, repeat):
+    perf = PerfLog()
+    df, csv, sqlite = build_dataset(sites, images)
+
+    _repeat(perf, "laden (sqlite)", lambda: int(sqlite.load().memory_usage(index=False).sum()), repeat)
+    # Neues Objekt je Lauf: sonst liefert der Speicher-Cache von CsvStorage
+    _repeat(perf, "laden (csv)", lambda: int(CsvStorage("data/locations.csv").load().memory_usage(index=False).sum()), repeat)
+
+    def page():
+        shown = filter_locations(df, status="Funktionstüchtig", text="teststraße 1").sort_values("nummer")
+        part, _ = page_slice(shown, 0, PAGE_SIZE)
+        nbytes = 0
+        for path in part["bild_pfad"]:
+            b64 = thumbnail_base64(path) if path else None
+            nbytes += len(b64) if b64 else 0
+        return nbytes
+    photos = [p for p in df["bild_pfad"].unique() if p][:PAGE_SIZE]
+    for path in photos:
+        with perf.timed("bild (kalt)") as sample:
+            sample["bytes"] = os.path.getsize(ensure_thumbnail(path))
+    _repeat(perf, "bild (warm)", lambda: len(thumbnail_base64(photos[0])) if photos else 0, repeat)
+    _repeat(perf, "liste", page, repeat)
+
+    import folium
+    valid = geocoded(df)
+    maps = []
+    def build_map():
+        m = folium.Map(location=[52.51, 13.48], zoom_start=12, tiles="OpenStreetMap")
+        add_site_markers(m, valid)
+        maps.append(m)
+    _repeat(perf, "karte aufbauen", build_map, repeat)
+    _repeat(perf, "karte html (st_folium)", lambda: len(maps.pop().get_root().render()), repeat)
+
+    index = SpatialIndex()
+    with perf.timed("umkreis: index"):
+        index.sync(df, version=0)
+    for _ in range(repeat):
+        with perf.timed("umkreis: 500 m"):
+            index.within(52.515, 13.48, 500)
+
+    ids = df["id"].tolist()
+    for name, storage in (("sqlite", sqlite), ("csv", csv)):
+        for n in range(repeat):
+            one = storage.get(ids[n])
+            with perf.timed(f"speichern 1 Zeile ({name})"):
+                storage.update(ids[n], {"status": "Defekt"}, expected=row_etags(one.to_frame().T)[ids[n]])
+        batch = storage.get_many(ids[:100]).assign(hersteller="Bench")
+        with perf.timed(f"speichern 100 Zeilen ({name})"):
+            storage.apply_changes(batch, expected=row_etags(storage.get_many(ids[:100])))
+
+    # Import (stückweise, Upsert) einer Datei gleicher Größe in einen leeren Speicher, ohne Geocodierung
+    write_synthetic_table("import.csv", sites)
+    target = SqliteStorage("data/import.sqlite", migrate_from=None)
+    merger, prefix = ImportMerger(target), new_id_prefix()
+    with perf.timed("import (csv, upsert)") as sample:
+        for fields, read in iter_fields("import.csv", "import.csv"):
+            merger.commit(build_rows(fields, 0, len(fields), [None] * len(fields), prefix))
+        sample["bytes"] = os.path.getsize("import.csv")
+
+    fields = next(iter_fields("import.csv", "import.csv", chunksize=GEOCODE_ADDRESSES))[0]
+    addresses = import_addresses(fields)
+    cache = GeoCache("data/geocache.sqlite")
+    with perf.timed("geocoding (stub, kalt)"):
+        geocode_many(addresses, stub_geocoder, cache)
+    with perf.timed("geocoding (cache)"):
+        geocode_many(addresses, stub_geocoder, cache)
+    cache.close()
+    return perf.summary()
+
+
+def compare(results, baseline, tolerance):
+    slower = []
+    for size, stages in results.items():
+        for stage, ms in stages.items():
+            old = baseline.get(size, {}).get(stage)
+            if old and ms > old * tolerance and ms - old > 1.0:
+                slower.append((size, stage, old, ms))
+    for size, stage, old, ms in slower:
+        print(f"LANGSAMER: {size} Standorte · {stage}: {old:.1f} -> {ms:.1f} ms ({ms / old:.1f}x)")
+    return not slower
+
+
+def run(sites_list, images, repeat, json_path=None, compare_path=None, tolerance=1.5):
+    results = {}
+    root = os.getcwd()
+    for sites in sites_list:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                summary = bench_size(sites, images, repeat)
+            finally:
+                os.chdir(root)
+        print(f"\n{sites} Standorte, {images} Fotos")
+        print(f"{'Schritt':<34} {'n':>3} {'p50 [ms]':>10} {'p90 [ms]':>10} {'Nutzlast [KB]':>14}")
+        for _, row in summary.iterrows():
+            size = "" if np.isnan(row["bytes_mittel"]) else f"{row['bytes_mittel'] / 1024:.1f}"
+            print(f"{row['schritt']:<34} {row['anzahl']:>3} {row['p50_ms']:>10.1f} {row['p90_ms']:>10.1f} {size:>14}")
+        results[str(sites)] = dict(zip(summary["schritt"], summary["p50_ms"].round(2)))
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
+    if compare_path:
+        with open(compare_path, encoding="utf-8") as f:
+            return compare(results, json.load(f), tolerance)
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sites", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--images", type=int, default=200, help="verschiedene Fotos, jeder zehnte Standort zeigt eins")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", default=None, help="Mediane je Schritt als JSON speichern")
+    parser.add_argument("--compare", default=None, help="mit früherer --json-Datei vergleichen")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="erlaubter Faktor gegenüber --compare")
+    args = parser.parse_args()
+    ok = run(args.sites, args.images, args.repeat, args.json, args.compare, args.tolerance)
+    sys.exit(0 if ok else 1)
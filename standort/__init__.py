@@ -0,0 +1 @@
+"""Datenlogik der Standort-Karte, unabhängig von Streamlit nutzbar."""
@@ -0,0 +1,6 @@
+"""Einstieg für ``python -m standort``."""
+import sys
+
+from standort.cli import main
+
+sys.exit(main())
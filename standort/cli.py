@@ -0,0 +1,193 @@
+"""Kommandozeile für Stapelverarbeitung ohne Streamlit.
+
+    python -m standort import DATEI [--no-geocode] [--chunk-size N]
+    python -m standort geocode --missing [--limit N]
+    python -m standort export [--folder ORDNER] [--zip DATEI]
+    python -m standort stats
+
+Pfade wie in der App relativ zum aktuellen Verzeichnis (data/...). Die Module
+werden erst im jeweiligen Befehl importiert: ``--help`` lädt weder pandas noch
+geopy, und geopy wird nur gebaut, wenn eine Adresse nicht im Cache steht.
+
+Exit-Code 0 bei Erfolg; 1, wenn geocode Standorte wegen gleichzeitiger
+Änderungen in der App nicht speichern konnte (sie kommen beim nächsten Lauf dran).
+"""
+import argparse
+import os
+import sys
+import time
+
+DATA_FOLDER = 'data'
+GEOCODE_BATCH = 100
+SAVE_RETRIES = 3  # Speicherversuche je Stapel, wenn Zeilen nebenher in der App geändert werden
+
+
+def _open(args):
+    from standort.storage import open_storage
+    os.makedirs(DATA_FOLDER, exist_ok=True)
+    return open_storage(args.storage)
+
+
+def _geocoding(args):
+    from standort.geocache import GEOCACHE_FILE, GeoCache
+    from standort.geocode import LazyGeocoder
+    return LazyGeocoder(), GeoCache(GEOCACHE_FILE)
+
+
+def _rate(rows, seconds):
+    return f"{rows / seconds:,.0f} Zeilen/s" if seconds > 0 else "-"
+
+
+def cmd_import(args):
+    from standort.geocache import geocode_many
+    from standort.importer import build_rows, import_addresses, iter_fields, new_id_prefix
+    from standort.matching import ImportMerger
+
+    storage = _open(args)
+    merger = ImportMerger(storage)
+    geocoder, cache = _geocoding(args) if not args.no_geocode else (None, None)
+    id_prefix = new_id_prefix()
+    t0 = time.perf_counter()
+    read = imported = found = 0
+    counts = {"neu": 0, "aktualisiert": 0, "unveraendert": 0}
+    # Stückweise lesen und speichern: der Speicherbedarf bleibt unabhängig von der Dateigröße.
+    # Vorhandene Standorte (gleiche Nummer/Bundesnummer/Adresse) werden aktualisiert statt verdoppelt.
+    for fields, read in iter_fields(args.datei, os.path.basename(args.datei), args.chunk_size):
+        if geocoder is None:
+            coords = [None] * len(fields)
+        else:
+            coords, _ = geocode_many(import_addresses(fields), geocoder, cache)
+        for key, n in merger.commit(build_rows(fields, 0, len(fields), coords, id_prefix)).items():
+            counts[key] += n
+        imported += len(fields)
+        found += sum(1 for c in coords if c)
+        print(f"{read} Zeilen gelesen, {read - imported} übersprungen, {counts['neu']} neu, {counts['aktualisiert']} aktualisiert, {counts['unveraendert']} unverändert, {found} mit Koordinaten · {_rate(read, time.perf_counter() - t0)}", flush=True)
+    print(f"Fertig: {counts['neu']} neu, {counts['aktualisiert']} aktualisiert aus {read} Zeilen in {time.perf_counter() - t0:.1f} s ({_rate(read, time.perf_counter() - t0)})")
+    return 0
+
+
+def cmd_geocode(args):
+    from standort.geocache import geocode_many
+    from standort.importer import DEFAULT_CITY
+    from standort.mapview import geocoded
+    from standort.storage import ConflictError, row_etags
+
+    storage = _open(args)
+    geocoder, cache = _geocoding(args)
+    df = storage.load()
+    todo = df if args.all else df[~df["id"].isin(geocoded(df)["id"])]
+    if args.limit: todo = todo.iloc[:args.limit]
+    print(f"{len(todo)} Standorte zu geocodieren")
+    t0 = time.perf_counter()
+    done = found = 0
+    conflicts = []
+    for start in range(0, len(todo), args.batch):
+        batch = todo.iloc[start:start + args.batch].copy()
+        city = batch["stadt"].where(batch["stadt"] != "", DEFAULT_CITY)
+        coords, stats = geocode_many((batch["strasse"] + ", " + batch["plz"] + " " + city).tolist(), geocoder, cache)
+        hit = [c is not None for c in coords]
+        batch = batch[hit]
+        if not batch.empty:
+            expected = row_etags(batch)
+            batch["breitengrad"] = [c[0] for c in coords if c]
+            batch["laengengrad"] = [c[1] for c in coords if c]
+            # In der App geänderte Zeilen auslassen, die kommen beim nächsten Lauf wieder dran.
+            # Jeder Versuch kann neue Konflikte finden; nach SAVE_RETRIES bleibt der Stapel liegen.
+            for attempt in range(SAVE_RETRIES):
+                try:
+                    storage.apply_changes(batch, expected={i: expected[i] for i in batch["id"]})
+                    break
+                except ConflictError as e:
+                    print(f"Zwischenzeitlich geändert, übersprungen: {', '.join(e.ids)}")
+                    conflicts += e.ids
+                    batch = batch[~batch["id"].isin(e.ids)]
+                    if batch.empty: break
+            else:
+                print(f"Stapel nach {SAVE_RETRIES} Versuchen nicht gespeichert: {len(batch)} Standorte")
+                conflicts += batch["id"].tolist()
+                batch = batch.iloc[0:0]
+        done += len(coords)
+        found += len(batch)
+        print(f"{done}/{len(todo)} · {found} gefunden · {stats['cache']} aus dem Cache · {_rate(done, time.perf_counter() - t0)}", flush=True)
+    if conflicts:
+        print(f"{len(conflicts)} Standorte wegen gleichzeitiger Änderungen nicht gespeichert: {', '.join(conflicts)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_export(args):
+    from standort.export import bundle_zip, export_bundle
+
+    storage = _open(args)
+    t0 = time.perf_counter()
+    stats = export_bundle(storage.load(), args.folder)
+    print(f"{stats['standorte']} Standorte · {stats['dateien_geschrieben']} Datendateien neu, {stats['dateien_unveraendert']} unverändert · {stats['bilder_neu']} neue Bilder · {time.perf_counter() - t0:.1f} s")
+    if not stats["karte"]:
+        print("Leaflet nicht verfügbar, das Paket zeigt nur die Liste (leaflet.js/leaflet.css nach standort/static/leaflet legen)", file=sys.stderr)
+    if args.zip:
+        with open(args.zip, "wb") as f:
+            f.write(bundle_zip(args.folder))
+        print(f"ZIP: {args.zip}")
+    return 0
+
+
+def cmd_stats(args):
+    import pandas as pd
+
+    from standort.history import HISTORY_FILE, StatusHistory, overdue_by_age
+    from standort.mapview import geocoded
+
+    df = _open(args).load()
+    print(f"Standorte:          {len(df)}")
+    print(f"mit Koordinaten:    {len(geocoded(df))}")
+    for status, n in df["status"].value_counts().items():
+        print(f"  {status + ':':<18}{n}")
+    print("Letzte Kontrolle vor:")
+    for label, n in overdue_by_age(df).items():
+        print(f"  {label + ':':<18}{n}")
+    if os.path.exists(HISTORY_FILE):
+        stats = StatusHistory(HISTORY_FILE).failure_stats()
+        if not stats.empty:
+            print("Ausfälle je Hersteller (MTBF in Tagen):")
+            for _, row in stats.iterrows():
+                mtbf = "-" if pd.isna(row["mtbf_tage"]) else f"{row['mtbf_tage']:.0f}"
+                print(f"  {(row['hersteller'] or '(ohne)') + ':':<18}{row['ausfaelle']} · MTBF {mtbf}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m standort", description="Standortverwaltung ohne Oberfläche")
+    parser.add_argument("--storage", choices=["sqlite", "csv"], default=None, help="Speicher-Backend (Standard: STANDORT_STORAGE oder sqlite)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("import", help="ODS/XLSX/CSV-Datei importieren")
+    p.add_argument("datei")
+    p.add_argument("--chunk-size", type=int, default=10_000, help="Zeilen pro Stück (Standard: 10000)")
+    p.add_argument("--no-geocode", action="store_true", help="ohne Koordinaten importieren, später mit 'geocode --missing'")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("geocode", help="Koordinaten nachtragen")
+    which = p.add_mutually_exclusive_group(required=True)
+    which.add_argument("--missing", action="store_true", help="nur Standorte ohne Koordinaten")
+    which.add_argument("--all", action="store_true", help="alle Standorte neu geocodieren")
+    p.add_argument("--limit", type=int, default=None)
+    p.add_argument("--batch", type=int, default=GEOCODE_BATCH, help="Standorte pro Speichervorgang")
+    p.set_defaults(func=cmd_geocode)
+
+    p = sub.add_parser("export", help="Offline-Paket erstellen/aktualisieren")
+    p.add_argument("--folder", default="data/export")
+    p.add_argument("--zip", default=None, help="zusätzlich als ZIP-Datei schreiben")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("stats", help="Kennzahlen ausgeben")
+    p.set_defaults(func=cmd_stats)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+"""Offline-Paket für die Tablets: statische HTML-Karte, Standortdaten und Vorschaubilder.
+
+Aufbau des Ordners (und der ZIP-Datei zum Herunterladen):
+
+    index.html            Karte + Liste mit Filtern, läuft direkt von der Platte (file://)
+    lib/leaflet.js|.css   Leaflet, damit die Karte ohne Netz startet
+    data/sites-NN.js      Standorte, nach Hash der id auf BUCKETS Dateien verteilt
+    sites.geojson.gz      alle Standorte als GeoJSON für andere Programme
+    thumbs/*.jpg          Vorschaubilder
+    manifest.json         Prüfsummen der Dateien für den nächsten Export
+
+Ein erneuter Export schreibt nur Dateien, deren Inhalt sich geändert hat: ein
+geänderter Standort ersetzt eine der Bucket-Dateien, neue Fotos kommen als
+einzelne Thumbnails dazu. Die Daten liegen als <script>-Dateien vor, weil
+Browser fetch() auf file://-Seiten blockieren.
+
+Leaflet kommt aus standort/static/leaflet; fehlt es dort, lädt der erste
+Export es einmal von unpkg (Prüfung per SRI-Hash) und legt es ab. Ohne Netz
+fehlen auf dem Tablet nur die Kacheln: die Karte zeigt dann einen Hinweis
+statt einer leeren Fläche, Punkte und Liste funktionieren weiter.
+"""
+import base64
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import urllib.request
+import zipfile
+
+import pandas as pd
+
+from standort.mapview import geocoded
+from standort.thumbs import ensure_thumbnail
+
+EXPORT_FOLDER = 'data/export'
+BUCKETS = 64
+SITE_FIELDS = ["id", "nummer", "bundesnummer", "strasse", "plz", "stadt", "status", "letzte_kontrolle", "lat", "lon", "bild"]
+LEAFLET_VERSION = "1.9.4"
+LEAFLET_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "leaflet")
+# SRI-Hashes der offiziellen Dateien (leafletjs.com/download.html)
+LEAFLET_FILES = {
+    "leaflet.css": "sha256-p4NxAoJBhIIN+hmNHrzRCf9tD/miZyoHS5obTRR9BMY=",
+    "leaflet.js": "sha256-20nQCchB9co0qIjJZRGuk2/Z9VM+kNiyxNV1lvTlZBo=",
+}
+
+
+def _sha1(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def _write_if_changed(path, data, old_hash):
+    # Schreibt atomar, aber nur wenn sich der Inhalt geändert hat; gibt (hash, geschrieben) zurück
+    new_hash = _sha1(data)
+    if new_hash == old_hash and os.path.exists(path): return new_hash, False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return new_hash, True
+
+
+def _sri(data):
+    return "sha256-" + base64.b64encode(hashlib.sha256(data).digest()).decode("ascii")
+
+
+def leaflet_assets(folder=LEAFLET_FOLDER, download=True):
+    # {Dateiname: Bytes} der Leaflet-Dateien oder None, wenn sie nicht zu bekommen sind
+    assets = {}
+    for name, sri in LEAFLET_FILES.items():
+        path = os.path.join(folder, name)
+        try:
+            with open(path, "rb") as f:
+                assets[name] = f.read()
+            continue
+        except OSError:
+            if not download: return None
+        try:
+            with urllib.request.urlopen(f"https://unpkg.com/leaflet@{LEAFLET_VERSION}/dist/{name}", timeout=10) as resp:
+                data = resp.read()
+        except OSError:
+            return None
+        if _sri(data) != sri: return None
+        _write_if_changed(path, data, None)
+        assets[name] = data
+    return assets
+
+
+def _site_records(df, thumbs):
+    # Kompakte Zeilen in der Reihenfolge von SITE_FIELDS, Koordinaten auf ~1 m gerundet
+    text = {col: df[col].astype(str).tolist() for col in ("id", "nummer", "bundesnummer", "strasse", "plz", "stadt", "status")}
+    dates = pd.to_datetime(df["letzte_kontrolle"], errors="coerce").dt.strftime("%Y-%m-%d").fillna("").tolist()
+    lat = df["breitengrad"].round(5).tolist()
+    lon = df["laengengrad"].round(5).tolist()
+    bild = [thumbs.get(i, "") for i in text["id"]]
+    return [list(r) for r in zip(text["id"], text["nummer"], text["bundesnummer"], text["strasse"], text["plz"], text["stadt"], text["status"], dates, lat, lon, bild)]
+
+
+def _export_thumbs(df, folder, known):
+    # Kopiert fehlende Vorschaubilder ins Paket; Dateinamen enthalten schon einen Inhalts-Schlüssel
+    thumbs, copied, present = {}, 0, set()
+    for entry_id, src in zip(df["id"].astype(str), df["bild_pfad"].astype(str)):
+        if not src: continue
+        path = ensure_thumbnail(src)
+        if path is None: continue
+        name = os.path.basename(path)
+        target = os.path.join(folder, "thumbs", name)
+        if name not in present and (name not in known or not os.path.exists(target)):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(path, target)
+            copied += 1
+        present.add(name)
+        thumbs[entry_id] = name
+    used = set(thumbs.values())
+    for name in set(known) - used:
+        try: os.remove(os.path.join(folder, "thumbs", name))
+        except OSError: pass
+    return thumbs, copied
+
+
+def _geojson(records):
+    features = [{"type": "Feature", "geometry": {"type": "Point", "coordinates": [r[9], r[8]]}, "properties": dict(zip(SITE_FIELDS[:8] + SITE_FIELDS[10:], r[:8] + r[10:]))} for r in records]
+    return json.dumps({"type": "FeatureCollection", "features": features}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def export_bundle(df, folder=EXPORT_FOLDER, buckets=BUCKETS):
+    # Baut bzw. aktualisiert das Paket aus dem geladenen DataFrame; gibt Kennzahlen zurück
+    manifest_path = os.path.join(folder, "manifest.json")
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    if manifest.get("buckets_total") != buckets: manifest = {}
+    old_files = manifest.get("files", {})
+
+    sites = geocoded(df)
+    thumbs, copied = _export_thumbs(sites, folder, manifest.get("thumbs", []))
+    records = _site_records(sites, thumbs)
+    bucket_of = (pd.util.hash_pandas_object(sites["id"].astype(str), index=False).to_numpy() % buckets).tolist()
+    grouped = {}
+    for bucket, record in zip(bucket_of, records):
+        grouped.setdefault(bucket, []).append(record)
+
+    files, written = {}, 0
+    for bucket in range(buckets):
+        name = f"data/sites-{bucket:02d}.js"
+        path = os.path.join(folder, name)
+        rows = grouped.get(bucket)
+        if not rows:
+            if os.path.exists(path): os.remove(path)
+            continue
+        data = ("standorte(" + json.dumps(rows, ensure_ascii=False, separators=(",", ":")) + ");\n").encode("utf-8")
+        files[name], changed = _write_if_changed(path, data, old_files.get(name))
+        written += changed
+
+    # Leaflet ins Paket; ist es gerade nicht zu bekommen, bleibt ein schon exportiertes liegen
+    leaflet = leaflet_assets()
+    lib_written = 0
+    for name in LEAFLET_FILES:
+        key, path = f"lib/{name}", os.path.join(folder, "lib", name)
+        if leaflet:
+            files[key], changed = _write_if_changed(path, leaflet[name], old_files.get(key))
+            lib_written += changed
+        elif key in old_files and os.path.exists(path):
+            files[key] = old_files[key]
+    has_map = all(f"lib/{name}" in files for name in LEAFLET_FILES)
+
+    if written or "sites.geojson.gz" not in old_files:
+        # mtime=0: gleicher Inhalt ergibt die gleiche Datei
+        data = gzip.compress(_geojson(records), mtime=0)
+        files["sites.geojson.gz"], changed = _write_if_changed(os.path.join(folder, "sites.geojson.gz"), data, None)
+    else:
+        files["sites.geojson.gz"] = old_files["sites.geojson.gz"]
+
+    # index.html verweist mit ?v=<hash> auf die Buckets, damit der Browser keine alten Daten nimmt.
+    # Ohne Änderung bleibt sie samt Datum "Stand" unangetastet.
+    unchanged = not written and not copied and not lib_written and set(files) == set(old_files) - {"index.html"}
+    if unchanged and os.path.exists(os.path.join(folder, "index.html")):
+        files["index.html"] = old_files["index.html"]
+    else:
+        scripts = "\n".join(f'<script src="{name}?v={files[name][:8]}"></script>' for name in sorted(files) if name.startswith("data/"))
+        lib = f'<link rel="stylesheet" href="lib/leaflet.css?v={files["lib/leaflet.css"][:8]}">\n<script src="lib/leaflet.js?v={files["lib/leaflet.js"][:8]}"></script>' if has_map else ""
+        html = _HTML.replace("<!--LEAFLET-->", lib).replace("<!--SCRIPTS-->", scripts).replace("<!--STAND-->", datetime.datetime.now().strftime("%d.%m.%Y %H:%M"))
+        files["index.html"], _ = _write_if_changed(os.path.join(folder, "index.html"), html.encode("utf-8"), old_files.get("index.html"))
+
+    manifest = {"buckets_total": buckets, "generated": datetime.datetime.now().isoformat(timespec="seconds"), "sites": len(records), "fields": SITE_FIELDS, "files": files, "thumbs": sorted(set(thumbs.values()))}
+    _write_if_changed(manifest_path, json.dumps(manifest, ensure_ascii=False, indent=1).encode("utf-8"), None)
+    return {"standorte": len(records), "dateien_geschrieben": written, "dateien_unveraendert": len([f for f in files if f.startswith("data/")]) - written, "bilder_neu": copied, "karte": has_map}
+
+
+def bundle_zip(folder=EXPORT_FOLDER):
+    # Das ganze Paket als ZIP (Bytes) für den Download
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for root, _, names in os.walk(folder):
+            for name in sorted(names):
+                if name.endswith(".tmp"): continue
+                path = os.path.join(root, name)
+                # Bilder und .gz sind schon komprimiert
+                compress = zipfile.ZIP_STORED if name.endswith((".jpg", ".gz")) else zipfile.ZIP_DEFLATED
+                zf.write(path, os.path.relpath(path, folder), compress_type=compress)
+    return buf.getvalue()
+
+
+_HTML = """<!DOCTYPE html>
+<html lang="de">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Standorte (offline)</title>
+<!--LEAFLET-->
+<style>
+body { margin: 0; font-family: sans-serif; color: #000; }
+header { padding: 8px; display: flex; gap: 6px; flex-wrap: wrap; align-items: center; border-bottom: 1px solid #eee; }
+header input, header select { padding: 6px; font-size: 15px; }
+#mapbox { position: relative; }
+#map { height: 55vh; }
+#map.offline { display: none; }
+#mapnote { position: absolute; top: 8px; left: 50px; right: 8px; z-index: 1000; padding: 8px; background: #fff; border: 1px solid #ddd; border-radius: 6px; color: #444; font-size: 14px; }
+#mapnote.static { position: static; margin: 8px; background: #f5f5f7; }
+#info { color: #666; font-size: 13px; }
+#list { padding: 0 8px; }
+.site { display: flex; justify-content: space-between; align-items: center; padding: 8px 0; border-bottom: 1px solid #eee; cursor: pointer; }
+.site img { width: 60px; height: 60px; object-fit: cover; border-radius: 6px; margin-left: 10px; }
+.site small { color: #666; }
+.defekt b { color: #ff3b30; }
+</style>
+</head>
+<body>
+<header>
+<input id="q" type="search" placeholder="Nummer, Bundesnummer oder Straße">
+<select id="status"><option value="">Alle</option><option>Funktionstüchtig</option><option>Defekt</option></select>
+<select id="plz"><option value="">Alle PLZ</option></select>
+<span id="info"></span>
+</header>
+<div id="mapbox"><div id="map"></div><div id="mapnote" hidden></div></div>
+<div id="list"></div>
+<script>
+var SITES = [];
+function standorte(rows) { Array.prototype.push.apply(SITES, rows); }
+</script>
+<!--SCRIPTS-->
+<script>
+// Felder: id, nummer, bundesnummer, strasse, plz, stadt, status, letzte_kontrolle, lat, lon, bild
+var LIMIT = 200, map = null, layer = null, markers = {};
+// nicht "status": window.status ist ein eingebauter String
+var fText = document.getElementById('q'), fStatus = document.getElementById('status'), fPlz = document.getElementById('plz');
+SITES.sort(function (a, b) { return a[1].localeCompare(b[1]); });
+Array.from(new Set(SITES.map(function (s) { return s[4]; }).filter(Boolean))).sort().forEach(function (p) {
+    var o = document.createElement('option'); o.textContent = p; fPlz.appendChild(o);
+});
+var note = document.getElementById('mapnote');
+function mapNote(text) { note.textContent = text; note.hidden = !text; }
+if (window.L) {
+    map = L.map('map', {preferCanvas: true});
+    // Ohne Netz schlagen alle Kacheln fehl: Hinweis statt grauer Fläche, die Punkte bleiben bedienbar
+    var tiles = L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {maxZoom: 19, attribution: '&copy; OpenStreetMap'}), tileErrors = 0, tilesOk = false;
+    tiles.on('tileload', function () { tilesOk = true; mapNote(''); });
+    tiles.on('tileerror', function () { if (!tilesOk && ++tileErrors >= 3) mapNote('Keine Karte offline: Kartenkacheln brauchen Internet. Punkte und Liste funktionieren weiter.'); });
+    tiles.addTo(map);
+    layer = L.layerGroup().addTo(map);
+} else {
+    document.getElementById('map').className = 'offline';
+    note.className = 'static';
+    mapNote('Keine Karte offline: Leaflet fehlt in diesem Paket. Die Liste funktioniert weiter.');
+}
+function matches(s, text, st, p) {
+    if (st && s[6] !== st) return false;
+    if (p && s[4] !== p) return false;
+    if (!text) return true;
+    return (s[1] + ' ' + s[2] + ' ' + s[3]).toLowerCase().indexOf(text) !== -1;
+}
+function render() {
+    var text = fText.value.trim().toLowerCase(), hits = [];
+    for (var i = 0; i < SITES.length; i++) if (matches(SITES[i], text, fStatus.value, fPlz.value)) hits.push(SITES[i]);
+    document.getElementById('info').textContent = hits.length + ' von ' + SITES.length + ' Standorten · Stand <!--STAND-->';
+    var list = document.getElementById('list');
+    list.textContent = '';
+    hits.slice(0, LIMIT).forEach(function (s) {
+        var row = document.createElement('div');
+        row.className = 'site' + (s[6] === 'Defekt' ? ' defekt' : '');
+        var text = document.createElement('div');
+        var title = document.createElement('b');
+        title.textContent = s[1] + ' - ' + s[2];
+        text.appendChild(title);
+        text.appendChild(document.createElement('br'));
+        var sub = document.createElement('small');
+        sub.textContent = s[3] + ', ' + s[4] + ' ' + s[5] + ' · ' + s[6] + (s[7] ? ' · ' + s[7] : '');
+        text.appendChild(sub);
+        row.appendChild(text);
+        if (s[10]) { var img = document.createElement('img'); img.loading = 'lazy'; img.src = 'thumbs/' + s[10]; row.appendChild(img); }
+        row.onclick = function () { if (map) { map.setView([s[8], s[9]], 18); markers[s[0]].openPopup(); window.scrollTo(0, 0); } };
+        list.appendChild(row);
+    });
+    if (hits.length > LIMIT) {
+        var more = document.createElement('p');
+        more.textContent = 'Die ersten ' + LIMIT + ' Treffer werden angezeigt.';
+        list.appendChild(more);
+    }
+    if (map) {
+        layer.clearLayers(); markers = {};
+        hits.forEach(function (s) {
+            var m = L.circleMarker([s[8], s[9]], {radius: 6, color: '#fff', weight: 1, fillColor: s[6] === 'Defekt' ? '#ff3b30' : '#34c759', fillOpacity: 0.9});
+            m.bindPopup(function () { var b = document.createElement('div'); var t = document.createElement('b'); t.textContent = s[1]; b.appendChild(t); b.appendChild(document.createElement('br')); b.appendChild(document.createTextNode(s[3] + ' · ' + s[6])); return b; });
+            markers[s[0]] = m.addTo(layer);
+        });
+        if (hits.length) map.fitBounds(hits.map(function (s) { return [s[8], s[9]]; }), {maxZoom: 17});
+        else map.setView([52.51, 13.48], 12);
+    }
+}
+fText.addEventListener('input', render);
+fStatus.addEventListener('change', render);
+fPlz.addEventListener('change', render);
+render();
+</script>
+</body>
+</html>
+"""
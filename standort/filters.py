@@ -0,0 +1,31 @@
+"""Serverseitige Filter und Seitenaufteilung für die Liste."""
+import math
+
+import numpy as np
+
+SEARCH_COLUMNS = ["nummer", "bundesnummer", "strasse"]
+
+
+def filter_locations(df, status=None, plz=None, hersteller=None, text=None):
+    # None/"" heißt: nicht filtern. Alle Bedingungen werden als eine Maske kombiniert.
+    mask = np.ones(len(df), dtype=bool)
+    if status: mask &= (df["status"] == status).to_numpy(dtype=bool)
+    if plz: mask &= (df["plz"] == plz).to_numpy(dtype=bool)
+    if hersteller: mask &= (df["hersteller"] == hersteller).to_numpy(dtype=bool)
+    text = (text or "").strip()
+    if text:
+        hit = np.zeros(len(df), dtype=bool)
+        for col in SEARCH_COLUMNS:
+            hit |= df[col].astype(str).str.contains(text, case=False, regex=False, na=False).to_numpy(dtype=bool)
+        mask &= hit
+    return df[mask]
+
+
+def page_count(n_rows, page_size):
+    return max(1, math.ceil(n_rows / page_size))
+
+
+def page_slice(df, page, page_size):
+    # page ist 0-basiert und wird auf den gültigen Bereich begrenzt
+    page = min(max(page, 0), page_count(len(df), page_size) - 1)
+    return df.iloc[page * page_size:(page + 1) * page_size], page
@@ -0,0 +1,113 @@
+"""Persistenter Cache Adresse -> Koordinaten (SQLite unter data/).
+
+Der Geocoder ist ein beliebiges Callable ``geocoder(adresse)``, das ein Objekt
+mit ``latitude``/``longitude`` oder None liefert (geopy, RateLimiter oder ein
+lokaler Stub für Tests).
+"""
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+GEOCACHE_FILE = 'data/geocache.sqlite'
+NEGATIVE_TTL = 30 * 24 * 3600  # nicht gefundene Adressen nach 30 Tagen erneut fragen
+
+MISS = object()  # Adresse noch nie nachgeschlagen (oder negativer Eintrag abgelaufen)
+
+
+def normalize_address(address):
+    # "Möllendorffstr. 5,  10367 Berlin" und "möllendorffstraße 5, 10367 berlin" -> gleicher Schlüssel
+    text = unicodedata.normalize("NFKC", str(address)).lower().replace("ß", "ss")
+    text = re.sub(r"str\.", "strasse ", text)
+    text = re.sub(r"\bstr\b", "strasse", text)
+    text = re.sub(r"\bnan\b", " ", text)
+    text = re.sub(r"[^\w]+", " ", text)
+    return " ".join(text.split())
+
+
+class GeoCache:
+    def __init__(self, path=GEOCACHE_FILE, negative_ttl=NEGATIVE_TTL):
+        self.path = path
+        self.negative_ttl = negative_ttl
+        # Eine Verbindung für alle Streamlit-Sessions, Zugriffe über den Lock serialisiert
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS geocache (key TEXT PRIMARY KEY, lat REAL, lon REAL, found INTEGER NOT NULL, ts REAL NOT NULL)")
+
+    def lookup_many(self, keys):
+        # -> {key: (lat, lon) oder None}; fehlende/abgelaufene Schlüssel fehlen im Ergebnis
+        keys = list(keys)
+        found = {}
+        expired_before = time.time() - self.negative_ttl
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                for key, lat, lon, ok, ts in self._conn.execute(f"SELECT key, lat, lon, found, ts FROM geocache WHERE key IN ({marks})", chunk):
+                    if ok: found[key] = (lat, lon)
+                    elif ts >= expired_before: found[key] = None
+        return found
+
+    def lookup(self, key):
+        return self.lookup_many([key]).get(key, MISS)
+
+    def store_many(self, items):
+        # items: [(key, (lat, lon) oder None)]
+        now = time.time()
+        rows = [(key, c[0] if c else None, c[1] if c else None, 1 if c else 0, now) for key, c in items]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO geocache (key, lat, lon, found, ts) VALUES (?, ?, ?, ?, ?)", rows)
+
+    def store(self, key, coords):
+        self.store_many([(key, coords)])
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _ask(geocoder, address):
+    # -> (lat, lon), None (nicht gefunden) oder MISS (Fehler, nicht cachen)
+    try:
+        loc = geocoder(address)
+    except Exception:
+        return MISS
+    return (loc.latitude, loc.longitude) if loc else None
+
+
+def geocode_cached(address, geocoder, cache):
+    key = normalize_address(address)
+    if not key: return None
+    coords = cache.lookup(key)
+    if coords is not MISS: return coords
+    coords = _ask(geocoder, address)
+    if coords is MISS: return None
+    cache.store(key, coords)
+    return coords
+
+
+def geocode_many(addresses, geocoder, cache, progress=None):
+    # Gleiche Adressen werden nur einmal, bekannte gar nicht mehr nachgeschlagen.
+    # Rückgabe: Liste (lat, lon)/None passend zu addresses und ein Statistik-Dict.
+    keys = [normalize_address(a) for a in addresses]
+    first_address = {}
+    for key, address in zip(keys, addresses):
+        if key and key not in first_address: first_address[key] = address
+
+    results = cache.lookup_many(first_address)
+    todo = [key for key in first_address if key not in results]
+    stats = {"adressen": len(first_address), "cache": len(results), "abgefragt": 0, "fehler": 0}
+    for i, key in enumerate(todo):
+        coords = _ask(geocoder, first_address[key])
+        stats["abgefragt"] += 1
+        if coords is MISS:
+            stats["fehler"] += 1
+            coords = None
+        else:
+            cache.store(key, coords)
+        results[key] = coords
+        if progress: progress(i + 1, len(todo))
+    return [results.get(key) if key else None for key in keys], stats
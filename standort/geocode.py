@@ -0,0 +1,23 @@
+"""Nominatim-Geocoder, erst beim ersten Aufruf gebaut (geopy wird nur dann importiert)."""
+USER_AGENT = "berlin_coord_fix"
+MIN_DELAY_SECONDS = 1.5
+
+
+def make_geocoder(user_agent=USER_AGENT, min_delay_seconds=MIN_DELAY_SECONDS):
+    from geopy.extra.rate_limiter import RateLimiter
+    from geopy.geocoders import Nominatim
+
+    geolocator = Nominatim(user_agent=user_agent)
+    # Fehler durchreichen, damit Netzprobleme nicht als "Adresse unbekannt" gecacht werden
+    return RateLimiter(geolocator.geocode, min_delay_seconds=min_delay_seconds, swallow_exceptions=False)
+
+
+class LazyGeocoder:
+    # Callable wie der RateLimiter; Aufbau erst bei der ersten Adresse (z.B. alles aus dem Cache -> nie)
+    def __init__(self, **kwargs):
+        self._kwargs = kwargs
+        self._geocode = None
+
+    def __call__(self, address):
+        if self._geocode is None: self._geocode = make_geocoder(**self._kwargs)
+        return self._geocode(address)
@@ -0,0 +1,123 @@
+"""Verlauf der Status- und Kontrolländerungen (nur anhängen, SQLite unter data/).
+
+Jede Änderung von ``status`` oder ``letzte_kontrolle`` wird als Ereignis mit
+Zeitstempel gespeichert; der Index auf (site_id, seq) macht die Zeitleiste
+eines Standorts zu einem Index-Lookup. In derselben Transaktion werden die
+Kennzahlen je Hersteller/Baujahr fortgeschrieben (Ausfälle, Abstände zwischen
+Ausfällen), das Dashboard liest nur diese kleinen Tabellen.
+"""
+import datetime
+import sqlite3
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+HISTORY_FILE = 'data/history.sqlite'
+TRACKED_FIELDS = ["status", "letzte_kontrolle"]
+FAILURE_STATUS = "Defekt"
+OVERDUE_BUCKETS = [("bis 1 Jahr", 365), ("1–2 Jahre", 730), ("2–3 Jahre", 1095)]
+
+
+def _text(values):
+    # Vergleichbare Textform (Datum als JJJJ-MM-TT, leer statt NaN/NaT)
+    dates = pd.to_datetime(values, errors="coerce") if values.name == "letzte_kontrolle" else None
+    if dates is not None:
+        return dates.dt.strftime("%Y-%m-%d").fillna("").to_numpy(dtype=object)
+    return values.astype(object).fillna("").astype(str).to_numpy(dtype=object)
+
+
+def change_events(before, after):
+    # Ereignisse aus alten und neuen Zeilen (gleiche ids, beliebige Reihenfolge).
+    # Zeilen ohne Vorgänger (neu angelegt) zählen mit leerem alten Wert.
+    if after is None or after.empty: return []
+    after = after.assign(id=after["id"].astype(str)).drop_duplicates("id", keep="last").set_index("id")
+    if before is None or before.empty:
+        before = pd.DataFrame(columns=after.columns, index=after.index)
+    else:
+        before = before.assign(id=before["id"].astype(str)).drop_duplicates("id", keep="last").set_index("id")
+    before = before.reindex(after.index)
+    hersteller = _text(after["hersteller"]) if "hersteller" in after else np.full(len(after), "", dtype=object)
+    baujahr = _text(after["baujahr"]) if "baujahr" in after else np.full(len(after), "", dtype=object)
+    events = []
+    for field in TRACKED_FIELDS:
+        if field not in after: continue
+        old = _text(before[field].rename(field))
+        new = _text(after[field].rename(field))
+        for pos in np.flatnonzero(old != new):
+            events.append((after.index[pos], field, old[pos], new[pos], hersteller[pos], baujahr[pos]))
+    return events
+
+
+class StatusHistory:
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS events (seq INTEGER PRIMARY KEY AUTOINCREMENT, site_id TEXT NOT NULL, ts TEXT NOT NULL, field TEXT NOT NULL, old TEXT, new TEXT, source TEXT)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_events_site ON events (site_id, seq)")
+            # Vorberechnet: je Standort der letzte Ausfall, je Hersteller/Baujahr die Summen
+            conn.execute("CREATE TABLE IF NOT EXISTS site_failures (site_id TEXT PRIMARY KEY, failures INTEGER NOT NULL, last_failure TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS failure_stats (hersteller TEXT NOT NULL, baujahr TEXT NOT NULL, failures INTEGER NOT NULL, intervals INTEGER NOT NULL, interval_days REAL NOT NULL, PRIMARY KEY (hersteller, baujahr))")
+
+    @contextmanager
+    def _connect(self):
+        # Wie in storage: eine Verbindung pro Vorgang, der Block ist eine Transaktion
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def record(self, events, source="", ts=None):
+        # events: [(site_id, field, old, new, hersteller, baujahr)], z.B. aus change_events
+        if not events: return 0
+        now = ts or datetime.datetime.now()
+        stamp = now.isoformat(timespec="seconds")
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("INSERT INTO events (site_id, ts, field, old, new, source) VALUES (?, ?, ?, ?, ?, ?)", [(site, stamp, field, old, new, source) for site, field, old, new, _, _ in events])
+            for site, field, old, new, hersteller, baujahr in events:
+                if field != "status" or new != FAILURE_STATUS or old == FAILURE_STATUS: continue
+                prev = conn.execute("SELECT last_failure FROM site_failures WHERE site_id = ?", (site,)).fetchone()
+                days = (now - datetime.datetime.fromisoformat(prev[0])).total_seconds() / 86400 if prev else None
+                conn.execute("INSERT INTO site_failures (site_id, failures, last_failure) VALUES (?, 1, ?) ON CONFLICT(site_id) DO UPDATE SET failures = failures + 1, last_failure = excluded.last_failure", (site, stamp))
+                conn.execute(
+                    "INSERT INTO failure_stats (hersteller, baujahr, failures, intervals, interval_days) VALUES (?, ?, 1, ?, ?) "
+                    "ON CONFLICT(hersteller, baujahr) DO UPDATE SET failures = failures + 1, intervals = intervals + excluded.intervals, interval_days = interval_days + excluded.interval_days",
+                    (hersteller, baujahr, 0 if days is None else 1, days or 0.0))
+        return len(events)
+
+    def timeline(self, site_id):
+        # Alle Ereignisse eines Standorts, älteste zuerst (Index-Lookup)
+        with self._connect() as conn:
+            return pd.read_sql_query("SELECT ts, field, old, new, source FROM events WHERE site_id = ? ORDER BY seq", conn, params=(str(site_id),))
+
+    def failure_count(self, site_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT failures FROM site_failures WHERE site_id = ?", (str(site_id),)).fetchone()
+        return row[0] if row else 0
+
+    def failure_stats(self, by="hersteller"):
+        # Ausfälle und mittlerer Abstand zwischen zwei Ausfällen (MTBF, Tage) je Hersteller oder Baujahr
+        if by not in ("hersteller", "baujahr"): raise ValueError(f"Unbekannte Gruppierung: {by}")
+        with self._connect() as conn:
+            df = pd.read_sql_query(f"SELECT {by}, SUM(failures) AS ausfaelle, SUM(intervals) AS abstaende, SUM(interval_days) AS tage FROM failure_stats GROUP BY {by} ORDER BY ausfaelle DESC", conn)
+        df["mtbf_tage"] = (df["tage"] / df["abstaende"].where(df["abstaende"] > 0)).round(1)
+        return df.drop(columns=["abstaende", "tage"])
+
+
+def overdue_by_age(df, today=None):
+    # Standorte nach Alter der letzten Kontrolle: Anzahl je Stufe, "nie" für fehlendes Datum
+    today = pd.Timestamp(today or datetime.date.today())
+    age = (today - pd.to_datetime(df["letzte_kontrolle"], errors="coerce")).dt.days.to_numpy(dtype="float64")
+    labels, lower = [], -np.inf
+    counts = []
+    for label, upper in OVERDUE_BUCKETS:
+        labels.append(label)
+        counts.append(int(((age > lower) & (age <= upper)).sum()))
+        lower = upper
+    labels += [f"über {OVERDUE_BUCKETS[-1][1] // 365} Jahre", "nie"]
+    counts += [int((age > lower).sum()), int(np.isnan(age).sum())]
+    return pd.Series(counts, index=labels, name="standorte")
@@ -0,0 +1,242 @@
+"""Einlesen und Zuordnen von Importdateien (ODS/XLSX/CSV)."""
+import datetime
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+# Zielspalte -> Stichwörter im Spaltenkopf der Importdatei
+IMPORT_KEYWORDS = {
+    "nummer": ["nummer", "nr.", "standort"],
+    "bundesnummer": ["bundes", "b-nr"],
+    "strasse": ["straße", "strasse", "adr"],
+    "plz": ["plz", "post"],
+    "stadt": ["stadt", "ort", "bezirk"],
+    "baujahr": ["baujahr", "jahr"],
+    "hersteller": ["hersteller", "firma"],
+}
+DEFAULT_CITY = "Berlin"
+# Ohne eine dieser Angaben lässt sich eine Importzeile weder zuordnen noch geocodieren
+REQUIRED_FIELDS = ["nummer", "bundesnummer", "strasse"]
+DEDUPE_FIELDS = ["nummer", "bundesnummer", "strasse", "plz", "stadt"]
+
+
+def read_table(source, filename):
+    # source: Pfad oder Datei-Objekt (z.B. Streamlit-Upload)
+    filename = filename.lower()
+    if filename.endswith(".csv"):
+        return pd.read_csv(source, dtype=str)
+    elif filename.endswith(".ods"):
+        return pd.read_excel(source, engine="odf", dtype=str)
+    return pd.read_excel(source, dtype=str)
+
+
+def _cell_text(value):
+    # Zellwert wie read_excel(dtype=str): ganze Zahlen ohne ".0", leere Zellen als None
+    if value is None or value == "": return None
+    if isinstance(value, float) and value.is_integer(): value = int(value)
+    return str(value)
+
+
+def _sheet_chunks(rows, chunksize):
+    # rows: Zeilen als Listen, die erste nicht leere ist der Kopf. Leere Zeilen
+    # (in Tabellenprogrammen oft tausendfach am Ende) werden übersprungen.
+    header, buffer = None, []
+    for values in rows:
+        values = [_cell_text(v) for v in values]
+        if all(v is None for v in values): continue
+        if header is None:
+            header = [v if v is not None else f"Unnamed: {i}" for i, v in enumerate(values)]
+            continue
+        buffer.append((values + [None] * len(header))[:len(header)])
+        if len(buffer) == chunksize:
+            yield pd.DataFrame(buffer, columns=header, dtype=object)
+            buffer = []
+    if header is not None:
+        yield pd.DataFrame(buffer, columns=header, dtype=object)
+
+
+def _xlsx_rows(source, progress=None):
+    # openpyxl im read_only-Modus liest das Blatt zeilenweise aus dem ZIP.
+    # Fortschritt über max_row aus dem Kopf des Blatts (fehlt bei manchen Programmen)
+    import openpyxl
+    wb = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        total = ws.max_row if progress is not None else None
+        for n, values in enumerate(ws.iter_rows(values_only=True), 1):
+            if total: progress["read"] = min(n / total, 1.0)
+            yield values
+    finally:
+        wb.close()
+
+
+_ODS_TABLE = "{urn:oasis:names:tc:opendocument:xmlns:table:1.0}"
+_ODS_TEXT = "{urn:oasis:names:tc:opendocument:xmlns:text:1.0}"
+_ODS_OFFICE = "{urn:oasis:names:tc:opendocument:xmlns:office:1.0}"
+_ODS_CELLS = (_ODS_TABLE + "table-cell", _ODS_TABLE + "covered-table-cell")
+_ODS_VALUE_ATTR = {"float": "value", "percentage": "value", "currency": "value", "date": "date-value", "time": "time-value", "boolean": "boolean-value"}
+
+
+def _ods_text(elem):
+    # Text eines Absatzes samt <text:s text:c="n"/> (Leerzeichen), Tabs und Zeilenumbrüchen
+    parts = [elem.text or ""]
+    for child in elem:
+        if child.tag == _ODS_TEXT + "s": parts.append(" " * int(child.get(_ODS_TEXT + "c", 1)))
+        elif child.tag == _ODS_TEXT + "tab": parts.append("\t")
+        elif child.tag == _ODS_TEXT + "line-break": parts.append("\n")
+        elif child.tag != _ODS_OFFICE + "annotation": parts.append(_ods_text(child))
+        parts.append(child.tail or "")
+    return "".join(parts)
+
+
+def _ods_value(cell):
+    attr = _ODS_VALUE_ATTR.get(cell.get(_ODS_OFFICE + "value-type"))
+    if attr == "value": return float(cell.get(_ODS_OFFICE + "value"))
+    if attr: return cell.get(_ODS_OFFICE + attr)
+    return "\n".join(_ods_text(p) for p in cell if p.tag == _ODS_TEXT + "p")
+
+
+def _ods_rows(source, progress=None):
+    # content.xml des ersten Blatts mit iterparse: jede Zeile wird nach dem Lesen aus dem
+    # Baum entfernt, der Speicherbedarf hängt daher nicht von der Zeilenzahl ab.
+    # Fortschritt: gelesene Bytes von content.xml (entpackt)
+    import xml.etree.ElementTree as ET
+    import zipfile
+    with zipfile.ZipFile(source) as zf, zf.open("content.xml") as f:
+        size = zf.getinfo("content.xml").file_size
+        stack = []
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            if event == "start":
+                stack.append(elem)
+                continue
+            stack.pop()
+            if elem.tag == _ODS_TABLE + "table": return
+            if elem.tag != _ODS_TABLE + "table-row": continue
+            values = []
+            for cell in elem:
+                if cell.tag in _ODS_CELLS:
+                    values.extend([_ods_value(cell)] * int(cell.get(_ODS_TABLE + "number-columns-repeated", 1)))
+            while values and values[-1] in (None, ""): values.pop()
+            repeat = int(elem.get(_ODS_TABLE + "number-rows-repeated", 1))
+            if stack: stack[-1].remove(elem)
+            if progress is not None and size: progress["read"] = min(f.tell() / size, 1.0)
+            # Leere Zeilen kommen oft als eine Zeile mit riesigem Wiederholungsfaktor
+            if values:
+                for _ in range(repeat): yield values
+
+
+def iter_chunks(source, filename, chunksize=10_000, progress=None):
+    # Importdatei in Stücken gleicher Spalten, ohne die ganze Datei im Speicher zu halten:
+    # CSV über pandas, XLSX mit openpyxl (read_only), ODS zeilenweise aus content.xml.
+    # progress: Dict, in dem progress["read"] den gelesenen Anteil der Datei (0..1) zeigt
+    filename = filename.lower()
+    if filename.endswith(".csv"):
+        if progress is None:
+            yield from pd.read_csv(source, dtype=str, chunksize=chunksize)
+            return
+        # Gelesene Bytes; pandas liest blockweise voraus, der Anteil eilt also höchstens einen Block vor
+        with open(source, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            for chunk in pd.read_csv(f, dtype=str, chunksize=chunksize):
+                progress["read"] = min(f.tell() / size, 1.0) if size else 1.0
+                yield chunk
+    elif filename.endswith(".ods"):
+        yield from _sheet_chunks(_ods_rows(source, progress), chunksize)
+    elif filename.endswith((".xlsx", ".xlsm")):
+        yield from _sheet_chunks(_xlsx_rows(source, progress), chunksize)
+    else:
+        # z.B. altes .xls: nur als Ganzes lesbar
+        df = read_table(source, filename)
+        for start in range(0, len(df), chunksize):
+            if progress is not None: progress["read"] = min((start + chunksize) / len(df), 1.0)
+            yield df.iloc[start:start + chunksize].reset_index(drop=True)
+
+
+def column_positions(columns):
+    # Erste Spalte (in Dateireihenfolge), deren Kopf eines der Stichwörter enthält
+    file_cols = [str(c).lower() for c in columns]
+    def get_col(kws):
+        for i, c in enumerate(file_cols):
+            for kw in kws:
+                if kw in c: return i
+        return None
+    return {field: get_col(kws) for field, kws in IMPORT_KEYWORDS.items()}
+
+
+def map_columns(df_new, positions=None):
+    if positions is None: positions = column_positions(df_new.columns)
+    return {field: None if i is None else df_new.iloc[:, i] for field, i in positions.items()}
+
+
+def extract_fields(df_new, positions=None):
+    # Spalten zuordnen und als ganze String-Spalten übernehmen. positions aus
+    # column_positions: beim stückweisen Lesen läuft die Zuordnung nur einmal
+    fields = {}
+    for field, col in map_columns(df_new, positions).items():
+        if col is None:
+            fields[field] = DEFAULT_CITY if field == "stadt" else ""
+        else:
+            fields[field] = col.fillna("").astype(str).str.strip().to_numpy()
+    return pd.DataFrame(fields, index=pd.RangeIndex(len(df_new)))
+
+
+def iter_fields(source, filename, chunksize=10_000, skip=0, progress=None):
+    # Stückweiser Import: liefert (fields, stop), stop = bis hier gelesene Dateizeilen.
+    # Der Index von fields ist die Zeilennummer in der Datei (daraus folgt die id).
+    # Verworfen werden Zeilen ohne Nummer, Bundesnummer und Straße sowie Wiederholungen
+    # einer früheren Zeile; dafür bleibt je Zeile nur ein 64-Bit-Hash in einem set. Nachschlagen
+    # und Aufnehmen kosten je Stück gleich viel, egal wie viel schon gelesen ist.
+    # skip: Dateizeilen, die schon importiert sind (Fortsetzen); ihre Hashes zählen mit.
+    # progress: siehe iter_chunks
+    positions, stop = None, 0
+    seen = set()
+    for chunk in iter_chunks(source, filename, chunksize, progress):
+        if positions is None: positions = column_positions(chunk.columns)
+        start, stop = stop, stop + len(chunk)
+        fields = extract_fields(chunk, positions)
+        fields.index = pd.RangeIndex(start, stop)
+        fields = fields[(fields[REQUIRED_FIELDS] != "").any(axis=1)]
+        keys = pd.util.hash_pandas_object(fields[DEDUPE_FIELDS], index=False).to_numpy()
+        known = np.fromiter((key in seen for key in keys.tolist()), dtype=bool, count=len(keys))
+        fresh = ~known & ~pd.Series(keys).duplicated().to_numpy()
+        seen.update(keys[fresh].tolist())
+        if stop <= skip: continue
+        fields = fields[fresh]
+        yield fields[fields.index >= skip], stop
+
+
+def import_addresses(fields, start=0, stop=None):
+    part = fields.iloc[start:stop]
+    return (part["strasse"] + ", " + part["plz"] + " " + part["stadt"]).tolist()
+
+
+def new_id_prefix():
+    # Je Import eindeutig (Datum + Zufallsteil), die Zeilennummer in der Datei macht die id
+    # eindeutig: zwei Importe am selben Tag erzeugen keine gleichen ids mehr
+    return datetime.date.today().strftime('%Y%m%d') + "-" + uuid.uuid4().hex[:6] + "-"
+
+
+def build_rows(fields, start, stop, coords, id_prefix):
+    # Zeilen start..stop der Importdatei spaltenweise im Format von locations.csv;
+    # coords[i] gehört zu Zeile start + i, die id folgt aus dem Index (Zeile in der Datei)
+    part = fields.iloc[start:stop]
+    lat = [c[0] if c else 0.0 for c in coords]
+    lon = [c[1] if c else 0.0 for c in coords]
+    return pd.DataFrame({
+        "id": [f"{id_prefix}{idx:04d}" for idx in part.index],
+        "nummer": part["nummer"].to_numpy(),
+        "bundesnummer": part["bundesnummer"].to_numpy(),
+        "strasse": part["strasse"].to_numpy(),
+        "plz": part["plz"].to_numpy(),
+        "stadt": part["stadt"].to_numpy(),
+        "typ": "Dialog Display",
+        "letzte_kontrolle": datetime.date.today(),
+        "breitengrad": lat,
+        "laengengrad": lon,
+        "bild_pfad": "",
+        "baujahr": part["baujahr"].to_numpy(),
+        "hersteller": part["hersteller"].to_numpy(),
+        "status": "Funktionstüchtig",
+    })
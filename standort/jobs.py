@@ -0,0 +1,265 @@
+"""Importe als Hintergrund-Jobs mit Zustandsdatei, Checkpoints und Fortsetzen.
+
+Jeder Job liegt unter data/jobs/<job_id>/ (Upload + state.json). Der Worker
+liest die Datei stückweise und verarbeitet sie in Batches: geocodieren, Zeilen spaltenweise bauen, über
+``commit`` in einem Schritt speichern, danach den Checkpoint (``done``) fortschreiben. Bricht der Prozess
+ab, setzt ``resume_jobs`` beim nächsten Start am letzten Checkpoint fort.
+Laufen mehrere App-Prozesse auf demselben data/, beansprucht der fortsetzende
+Prozess den Job vorher über eine Datei ``claim`` (O_EXCL, mit pid); Ansprüche
+beendeter Prozesse gelten als verwaist und werden übernommen. Von den fertigen
+Jobs bleiben nur die letzten MAX_FINISHED als Protokoll.
+Gibt ``commit`` ein Dict mit Zählern zurück (z.B. ImportMerger.commit), werden
+diese im Zustand aufsummiert. ``progress`` (0..1) ist der verarbeitete Anteil der
+Datei, geschätzt aus den gelesenen Bytes bzw. der Zeilenzahl des Blatts.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from standort.geocache import geocode_many
+from standort.importer import build_rows, import_addresses, iter_fields, new_id_prefix
+
+JOBS_FOLDER = 'data/jobs'
+BATCH_SIZE = 50  # Zeilen pro Geocodier-Schritt
+COMMIT_ROWS = 1000  # Zeilen pro gelesenem Stück
+COMMIT_SECONDS = 10
+MAX_FINISHED = 20
+
+RUNNING, DONE, FAILED = "läuft", "fertig", "fehler"
+
+_threads = {}
+_threads_lock = threading.Lock()
+# Unterscheidet diesen Prozess von einem früheren mit derselben pid (z.B. nach Neustart im Container)
+_PROCESS_TOKEN = uuid.uuid4().hex
+# list_jobs: Inhalt von JOBS_FOLDER je mtime, Zustand je Job nach stat von state.json
+_listing = {"mtime": None, "ids": []}
+_states = {}
+_cache_lock = threading.Lock()
+
+
+def _job_dir(job_id):
+    return os.path.join(JOBS_FOLDER, job_id)
+
+
+def _write_state(state):
+    state["updated"] = time.time()
+    path = os.path.join(_job_dir(state["id"]), "state.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    # Atomar ersetzen: ein Absturz hinterlässt nie eine halbe Zustandsdatei
+    os.replace(path + ".tmp", path)
+
+
+def get_job(job_id):
+    try:
+        with open(os.path.join(_job_dir(job_id), "state.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def list_jobs():
+    # Neueste zuerst. Gelesen werden nur geänderte state.json, der Rest kommt aus dem Cache;
+    # die Einträge nicht verändern.
+    try:
+        mtime = os.stat(JOBS_FOLDER).st_mtime_ns
+    except OSError:
+        return []
+    with _cache_lock:
+        if _listing["mtime"] != mtime:
+            _listing["mtime"], _listing["ids"] = mtime, [d for d in os.listdir(JOBS_FOLDER) if not d.startswith(".")]
+        jobs = []
+        for job_id in _listing["ids"]:
+            try:
+                stat = os.stat(os.path.join(_job_dir(job_id), "state.json"))
+            except OSError:
+                continue
+            key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+            cached = _states.get(job_id)
+            if cached is None or cached[0] != key:
+                cached = _states[job_id] = (key, get_job(job_id))
+            if cached[1]: jobs.append(cached[1])
+        for job_id in set(_states) - set(_listing["ids"]):
+            del _states[job_id]
+    return sorted(jobs, key=lambda j: j["created"], reverse=True)
+
+
+def prune_jobs(keep=MAX_FINISHED):
+    # Fertige Jobs über die letzten keep hinaus löschen; abgebrochene bleiben zum Fortsetzen
+    for job in [j for j in list_jobs() if j["status"] == DONE][keep:]:
+        shutil.rmtree(_job_dir(job["id"]), ignore_errors=True)
+
+
+@contextmanager
+def _claims_locked():
+    # Prüfen und Anlegen eines Anspruchs unter einer Sperre über Prozesse hinweg,
+    # sonst könnten zwei Prozesse denselben verwaisten Anspruch gleichzeitig ersetzen
+    os.makedirs(JOBS_FOLDER, exist_ok=True)
+    with open(os.path.join(JOBS_FOLDER, ".claims.lock"), "a+") as fh:
+        if fcntl: fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl: fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _pid_alive(pid):
+    if os.name == "nt": return True  # os.kill(pid, 0) würde dort den Prozess beenden
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def _claim_stale(job_id, path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            pid, token = f.read().split()
+        pid = int(pid)
+    except (OSError, ValueError):
+        return True  # leer oder kaputt: beim Anlegen abgestürzt
+    if token == _PROCESS_TOKEN:
+        # Eigener Anspruch ohne laufenden Thread (der Thread gibt ihn sonst am Ende frei)
+        thread = _threads.get(job_id)
+        return thread is None or not thread.is_alive()
+    return pid == os.getpid() or not _pid_alive(pid)
+
+
+def _claim(job_id):
+    # True, wenn dieser Prozess den Job jetzt bearbeiten darf. Aufruf unter _threads_lock.
+    path = os.path.join(_job_dir(job_id), "claim")
+    with _claims_locked():
+        if os.path.exists(path):
+            if not _claim_stale(job_id, path): return False
+            os.remove(path)
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(f"{os.getpid()} {_PROCESS_TOKEN}")
+    return True
+
+
+def _release(job_id):
+    try: os.remove(os.path.join(_job_dir(job_id), "claim"))
+    except OSError: pass
+
+
+def is_alive(job_id):
+    with _threads_lock:
+        thread = _threads.get(job_id)
+        return thread is not None and thread.is_alive()
+
+
+def _run(job_id, geocoder, geocache, commit):
+    state = get_job(job_id)
+    try:
+        # Die Datei wird stückweise gelesen (iter_fields), der Speicherbedarf hängt nicht
+        # von ihrer Größe ab. "done" zählt gelesene Dateizeilen, "total" steht erst am Ende fest.
+        t0, read_from = time.monotonic(), state["done"]
+        read, read_before = {}, state.get("progress") or 0.0
+        for fields, chunk_stop in iter_fields(state["source"], state["filename"], COMMIT_ROWS, skip=state["done"], progress=read):
+            chunk_start, pending_start, pending, last_commit = state["done"], 0, [], time.monotonic()
+            read_after = read.get("read", read_before)
+            for start in range(0, len(fields), BATCH_SIZE):
+                stop = min(start + BATCH_SIZE, len(fields))
+                coords, _ = geocode_many(import_addresses(fields, start, stop), geocoder, geocache)
+                pending.extend(coords)
+                # Ein Stück am Ende gemeinsam speichern; bei langsamer Geocodierung spätestens alle COMMIT_SECONDS
+                if stop == len(fields) or time.monotonic() - last_commit >= COMMIT_SECONDS:
+                    counts = commit(build_rows(fields, pending_start, stop, pending, state["id_prefix"])) or {}
+                    for key, n in counts.items(): state[key] = state.get(key, 0) + n
+                    # Checkpoint erst nach dem Speichern; commit muss wiederholte Zeilen daher
+                    # erkennen (gleiche id oder Nummer) und darf sie nicht doppelt anlegen
+                    found = sum(1 for c in pending if c)
+                    state["done"] = chunk_stop if stop == len(fields) else int(fields.index[stop])
+                    # Innerhalb eines Stücks anteilig nach verarbeiteten Zeilen
+                    state["progress"] = read_before + (read_after - read_before) * stop / len(fields)
+                    state["geocoded"] += found
+                    state["failed"] += len(pending) - found
+                    _write_state(state)
+                    pending_start, pending, last_commit = stop, [], time.monotonic()
+            # Leere, unvollständige und doppelte Zeilen (siehe iter_fields)
+            state["skipped"] = state.get("skipped", 0) + chunk_stop - chunk_start - len(fields)
+            state["done"] = chunk_stop
+            state["progress"] = read_before = read_after
+            state["rate"] = (state["done"] - read_from) / max(time.monotonic() - t0, 1e-9)
+            _write_state(state)
+        state["total"] = state["done"]
+        state["progress"] = 1.0
+        state["status"] = DONE
+        # Upload wird nicht mehr gebraucht, state.json bleibt als Protokoll
+        try: os.remove(state["source"])
+        except OSError: pass
+    except Exception as e:
+        state["status"] = FAILED
+        state["error"] = str(e)
+    _write_state(state)
+    _release(job_id)
+    if state["status"] == DONE: prune_jobs()
+
+
+def _start_thread(job_id, geocoder, geocache, commit, resume=False):
+    # Startet den Worker, wenn der Job hier nicht schon läuft und sich beanspruchen lässt
+    with _threads_lock:
+        thread = _threads.get(job_id)
+        if thread is not None and thread.is_alive(): return False
+        if not _claim(job_id): return False
+        if resume:
+            # Zustand erst nach dem Beanspruchen lesen: bis dahin kann ein anderer Prozess geschrieben haben
+            state = get_job(job_id)
+            if state is None or state["status"] == DONE:
+                _release(job_id)
+                return False
+            state["status"], state["error"] = RUNNING, None
+            _write_state(state)
+        thread = threading.Thread(target=_run, args=(job_id, geocoder, geocache, commit), name=f"import-{job_id}", daemon=True)
+        _threads[job_id] = thread
+        thread.start()
+    return True
+
+
+def start_import_job(data, filename, geocoder, geocache, commit):
+    # data: Bytes des Uploads. Die Datei wird kopiert, damit der Job ohne Browser weiterläuft.
+    job_id = pd.Timestamp.now().strftime('%Y%m%d%H%M%S') + "-" + uuid.uuid4().hex[:6]
+    os.makedirs(_job_dir(job_id), exist_ok=True)
+    source = os.path.join(_job_dir(job_id), "upload" + os.path.splitext(filename)[1].lower())
+    with open(source, "wb") as f:
+        f.write(data)
+    state = {"id": job_id, "filename": filename, "source": source, "status": RUNNING, "total": None, "done": 0, "geocoded": 0, "failed": 0, "skipped": 0, "progress": 0.0, "rate": None, "error": None, "created": time.time(), "id_prefix": new_id_prefix()}
+    _write_state(state)
+    _start_thread(job_id, geocoder, geocache, commit)
+    return job_id
+
+
+def resume_job(job_id, geocoder, geocache, commit):
+    # False, wenn der Job fertig ist oder schon läuft (hier oder in einem anderen Prozess)
+    state = get_job(job_id)
+    if state is None or state["status"] == DONE: return False
+    return _start_thread(job_id, geocoder, geocache, commit, resume=True)
+
+
+def resume_jobs(geocoder, geocache, commit):
+    # Jobs, die als "läuft" markiert sind, aber keinen Thread mehr haben (Neustart/Absturz).
+    # Beim Start auch alte fertige Jobs aufräumen (z.B. aus Läufen vor MAX_FINISHED).
+    prune_jobs()
+    for state in list_jobs():
+        if state["status"] == RUNNING and not is_alive(state["id"]):
+            resume_job(state["id"], geocoder, geocache, commit)
@@ -0,0 +1,94 @@
+"""Kartenlayer für viele Standorte: ein kompaktes Datenarray statt tausender Marker-Objekte.
+
+folium wird erst in den Layer-Funktionen importiert; geocoded() und find_site_at()
+brauchen nur pandas/numpy (CLI, Export, Index).
+"""
+import numpy as np
+
+# Wird im Browser einmal pro Datenzeile aufgerufen: [lat, lon, defekt, nummer, strasse, status]
+_MARKER_CALLBACK = """function (row) {
+    var defekt = row[2] === 1;
+    var icon = L.AwesomeMarkers.icon({
+        icon: defekt ? 'exclamation-sign' : 'ok-sign',
+        markerColor: defekt ? 'red' : 'green',
+        prefix: 'glyphicon'
+    });
+    var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icon});
+    // Popup erst beim Öffnen bauen, textContent statt HTML-Strings
+    marker.bindPopup(function () {
+        var box = document.createElement('div');
+        box.style.cssText = 'width:160px; font-family:sans-serif;';
+        var nr = document.createElement('b');
+        nr.textContent = row[3];
+        box.appendChild(nr);
+        box.appendChild(document.createElement('br'));
+        box.appendChild(document.createTextNode(row[4]));
+        box.appendChild(document.createElement('br'));
+        box.appendChild(document.createTextNode('Status: '));
+        var st = document.createElement('b');
+        st.textContent = row[5];
+        box.appendChild(st);
+        return box;
+    }, {maxWidth: 200});
+    return marker;
+}"""
+
+# Nummerierte Stopps einer Tour: [lat, lon, nr, farbe, nummer, strasse]
+_STOP_CALLBACK = """function (row) {
+    var icon = L.divIcon({
+        className: '',
+        html: '<div style="background:' + row[3] + '; color:#fff; border-radius:50%; width:22px; height:22px; line-height:22px; text-align:center; font:bold 11px sans-serif; border:1px solid #fff;">' + row[2] + '</div>',
+        iconSize: [22, 22], iconAnchor: [11, 11]
+    });
+    var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icon});
+    marker.bindPopup(function () {
+        var box = document.createElement('div');
+        var nr = document.createElement('b');
+        nr.textContent = row[2] + '. ' + row[4];
+        box.appendChild(nr);
+        box.appendChild(document.createElement('br'));
+        box.appendChild(document.createTextNode(row[5]));
+        return box;
+    });
+    return marker;
+}"""
+
+ROUTE_COLORS = ["#0071e3", "#ff9500", "#af52de", "#34c759", "#ff2d55", "#5ac8fa", "#8e8e93", "#a2845e"]
+
+
+def geocoded(df):
+    # Nur Zeilen mit brauchbaren Koordinaten (0.0 = fehlt, NaN = leer in der CSV)
+    lat, lon = df['breitengrad'], df['laengengrad']
+    return df[(lat != 0.0) & (lon != 0.0) & lat.notna() & lon.notna()]
+
+
+def marker_rows(df):
+    is_defekt = (df['status'].astype(str) == "Defekt").astype(int)
+    return [list(r) for r in zip(df['breitengrad'].tolist(), df['laengengrad'].tolist(), is_defekt.tolist(), df['nummer'].astype(str).tolist(), df['strasse'].astype(str).tolist(), df['status'].astype(str).tolist())]
+
+
+def add_site_markers(m, df):
+    # Alle Standorte als ein Cluster-Layer; ab Zoom 17 werden Einzelmarker gezeigt
+    from folium.plugins import FastMarkerCluster
+    FastMarkerCluster(marker_rows(df), callback=_MARKER_CALLBACK, chunkedLoading=True, disableClusteringAtZoom=17).add_to(m)
+    return m
+
+
+def find_site_at(df, lat, lon, tol=1e-5):
+    # Ordnet einen Klick auf der Karte (st_folium liefert nur lat/lng) dem Standort zu
+    if df.empty or lat is None or lon is None: return None
+    d2 = (df['breitengrad'].to_numpy(dtype=float) - lat) ** 2 + (df['laengengrad'].to_numpy(dtype=float) - lon) ** 2
+    pos = int(np.nanargmin(d2))
+    if d2[pos] > tol ** 2: return None
+    return df.iloc[pos]
+
+
+def add_route(m, stops, start, color):
+    # Linie Start -> Stopps in Reihenfolge, dazu nummerierte Stopps (ab Zoom 15 ungeclustert)
+    import folium
+    from folium.plugins import FastMarkerCluster
+    points = [list(start)] + stops[['breitengrad', 'laengengrad']].to_numpy(dtype=float).tolist()
+    folium.PolyLine(points, color=color, weight=3, opacity=0.8).add_to(m)
+    rows = [[lat, lon, nr, color, nummer, strasse] for nr, (lat, lon, nummer, strasse) in enumerate(zip(stops['breitengrad'].tolist(), stops['laengengrad'].tolist(), stops['nummer'].astype(str).tolist(), stops['strasse'].astype(str).tolist()), start=1)]
+    FastMarkerCluster(rows, callback=_STOP_CALLBACK, chunkedLoading=True, disableClusteringAtZoom=15).add_to(m)
+    return m
@@ -0,0 +1,197 @@
+"""Abgleich importierter Zeilen mit vorhandenen Standorten (Upsert statt Anhängen).
+
+Ein Hash-Index im Speicher ordnet Nummer, Bundesnummer und normalisierte
+Adresse (Straße + PLZ) der id des Standorts zu. Eine Importzeile wird in dieser
+Reihenfolge zugeordnet; über Bundesnummer oder Adresse nur, wenn dabei keine
+zwei verschiedenen Nummern aufeinandertreffen. Treffen mehrere Zeilen eines
+Stücks denselben Standort, gilt die mit dem genauesten Treffer (Nummer vor
+Bundesnummer vor Adresse), bei gleichem Rang die letzte. Zugeordnete Standorte bekommen die
+geänderten Stammdaten, Status, Kontrolldatum, Typ und Bild bleiben. Der Rest
+wird mit seiner (eindeutigen) Import-id neu angelegt.
+
+Der Index wird einmal aus dem Speicher gebaut und danach mit jedem Stück
+fortgeschrieben; neu gebaut wird nur, wenn jemand anderes geschrieben hat.
+Ein Import ist damit linear in Datei- plus Bestandsgröße.
+"""
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from standort.storage import ConflictError, row_etags
+
+# Stammdaten aus der Importdatei; leere Zellen überschreiben nichts
+IMPORT_FIELDS = ["nummer", "bundesnummer", "strasse", "plz", "stadt", "baujahr", "hersteller"]
+ADDRESS_FIELDS = ["strasse", "plz", "stadt"]
+MAX_RETRIES = 3
+# Rang eines Treffers: kleiner ist genauer
+BY_NUMMER, BY_BUNDESNUMMER, BY_ADDRESS = 0, 1, 2
+
+_STREET_SUFFIX = re.compile(r"(straße|strasse|str\.?)(?=\s|\d|$)")
+_NON_ALNUM = re.compile(r"[^0-9a-zäöüß]+")
+
+
+def number_keys(values):
+    return values.fillna("").astype(str).str.strip().str.casefold()
+
+
+def address_keys(strasse, plz):
+    # "Frankfurter Allee 5", "frankfurter allee  5" und "Frankfurter-Allee 5" -> gleicher Schlüssel;
+    # "Musterstraße", "Musterstr." und "Musterstrasse" ebenso. Ohne Straße: leerer Schlüssel.
+    street = number_keys(strasse).str.replace(_STREET_SUFFIX, "str", regex=True).str.replace(_NON_ALNUM, "", regex=True)
+    key = street + "|" + number_keys(plz)
+    return key.where(street != "", "")
+
+
+class SiteMatcher:
+    def __init__(self, df):
+        self.ids = set()
+        self.by_nummer, self.by_bundesnummer, self.by_address = {}, {}, {}
+        self.numbered = set()
+        # Schlüssel je Standort, um sie bei einer Änderung wieder zu entfernen, und weitere
+        # Standorte mit schon vergebenem Schlüssel (rücken nach, wenn der erste ihn verliert)
+        self._keys_of = {}
+        self._later = {}
+        self.add(df)
+
+    @staticmethod
+    def _keys(df):
+        return zip(df["id"].astype(str).tolist(), number_keys(df["nummer"]).tolist(),
+                   number_keys(df["bundesnummer"]).tolist(), address_keys(df["strasse"], df["plz"]).tolist())
+
+    def _put(self, kind, index, key, site):
+        if index.setdefault(key, site) != site: self._later.setdefault((kind, key), []).append(site)
+
+    def _drop(self, kind, index, key, site):
+        later = self._later.get((kind, key))
+        if index.get(key) == site:
+            if later:
+                index[key] = later.pop(0)
+            else:
+                del index[key]
+        elif later and site in later:
+            later.remove(site)
+        if later == []: del self._later[(kind, key)]
+
+    def _add(self, site, n, b, a):
+        # Bei mehrfach vergebenen Schlüsseln gewinnt der erste Standort. Kommt ein Standort
+        # geändert wieder, gelten seine alten Schlüssel nicht mehr.
+        self.ids.add(site)
+        old = self._keys_of.get(site, ("", "", ""))
+        self._keys_of[site] = (n, b, a)
+        for kind, index, before, key in ((BY_NUMMER, self.by_nummer, old[0], n), (BY_BUNDESNUMMER, self.by_bundesnummer, old[1], b),
+                                         (BY_ADDRESS, self.by_address, old[2], a)):
+            if before == key: continue
+            if before: self._drop(kind, index, before, site)
+            if key: self._put(kind, index, key, site)
+        if n: self.numbered.add(site)
+        else: self.numbered.discard(site)
+
+    def _lookup(self, n, b, a):
+        # -> (id, Rang) oder (None, None)
+        site = n and self.by_nummer.get(n)
+        if site: return site, BY_NUMMER
+        for kind, index, key in ((BY_BUNDESNUMMER, self.by_bundesnummer, b), (BY_ADDRESS, self.by_address, a)):
+            site = key and index.get(key)
+            # Haben beide eine (verschiedene) Nummer, ist es ein anderer Standort
+            if site and not (n and site in self.numbered): return site, kind
+        return None, None
+
+    def add(self, df):
+        # Neue oder geänderte Standorte aufnehmen
+        if df is None or df.empty: return
+        for keys in self._keys(df):
+            self._add(*keys)
+
+    def match(self, rows, learn=False):
+        # Je Zeile (id des vorhandenen Standorts, Rang des Treffers) oder (None, None).
+        # learn: nicht zugeordnete Zeilen gleich aufnehmen, damit spätere Zeilen desselben
+        # Stücks auf sie treffen.
+        out = []
+        for site, n, b, a in self._keys(rows):
+            hit = self._lookup(n, b, a)
+            if hit[0] is None and learn: self._add(site, n, b, a)
+            out.append(hit)
+        return out
+
+
+def merge_rows(rows, current, matched):
+    # rows: Importzeilen (build_rows), current: vorhandene Zeilen mit id als Index,
+    # matched: (id, Rang) je Zeile aus SiteMatcher.match; id ist ein vorhandener Standort,
+    # eine frühere neue Zeile desselben Stücks oder None.
+    # -> (upserts, neu, aktualisiert, unverändert)
+    rows = rows.reset_index(drop=True)
+    target = pd.Series([own if m is None else m for (m, _), own in zip(matched, rows["id"].astype(str))], dtype=object)
+    # Mehrere Zeilen für denselben Standort: genauester Treffer zuerst, bei gleichem Rang die
+    # spätere Zeile; eine eigene (neue) Zeile zählt wie ein Treffer über die Nummer
+    rank = np.array([BY_NUMMER if kind is None else kind for _, kind in matched], dtype="int64")
+    order = np.lexsort((-np.arange(len(rows)), rank))
+    rows, target = rows.iloc[order], target.iloc[order]
+    existing = target.isin(current.index).to_numpy()
+    # Neue Zeilen, mehrfach in einem Stück: unter der id der ersten. Danach wieder in Dateireihenfolge.
+    new = rows[~existing].assign(id=target[~existing].to_numpy()).drop_duplicates("id", keep="first").sort_index()
+    upd = rows[existing].assign(id=target[existing].to_numpy()).drop_duplicates("id", keep="first").sort_index().set_index("id")
+    base = current.reindex(upd.index)
+    merged = base.copy()
+    for col in IMPORT_FIELDS:
+        incoming = upd[col].fillna("").astype(str)
+        merged[col] = incoming.where(incoming != "", base[col])
+    # Koordinaten nur übernehmen, wenn sich die Adresse geändert hat oder bisher keine da waren
+    moved = (merged[ADDRESS_FIELDS].astype(str) != base[ADDRESS_FIELDS].astype(str)).any(axis=1)
+    found = (upd["breitengrad"] != 0.0) & (upd["laengengrad"] != 0.0)
+    missing = (base["breitengrad"].fillna(0.0) == 0.0) | (base["laengengrad"].fillna(0.0) == 0.0)
+    take = found & (moved | missing)
+    for col in ("breitengrad", "laengengrad"):
+        merged[col] = upd[col].where(take, base[col])
+    merged, base = merged.reset_index(), base.reset_index()
+    before, after = row_etags(base), row_etags(merged)
+    changed = merged[[after[i] != before[i] for i in merged["id"]]] if len(merged) else merged
+    upserts = pd.concat([changed, new], ignore_index=True) if len(new) else changed
+    return upserts, len(new), len(changed), len(merged) - len(changed)
+
+
+class ImportMerger:
+    """Schreibt Import-Stücke per Upsert in einen Speicher (thread-sicher, ein Objekt für alle Jobs)."""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self._lock = threading.Lock()
+        self._matcher = None
+        self._signature = None
+
+    def _index(self):
+        # Neu aufbauen, wenn seit dem letzten eigenen Schreiben jemand anderes geschrieben hat
+        sig = self.storage.signature()
+        if self._matcher is None or sig != self._signature:
+            self._matcher = SiteMatcher(self.storage.load())
+            self._signature = sig
+        return self._matcher
+
+    def commit(self, rows):
+        # rows: Zeilen aus build_rows -> {"neu": n, "aktualisiert": n, "unveraendert": n}
+        if rows is None or rows.empty: return {"neu": 0, "aktualisiert": 0, "unveraendert": 0}
+        with self._lock:
+            for attempt in range(MAX_RETRIES):
+                try:
+                    matched = self._index().match(rows, learn=True)
+                    current = self.storage.get_many([m for m, _ in matched if m is not None]).set_index("id")
+                    current = current[~current.index.duplicated()]
+                    upserts, added, updated, unchanged = merge_rows(rows, current, matched)
+                    written = self.storage.apply_changes(upserts, expected=row_etags(current.reset_index()))
+                except ConflictError:
+                    # Standort wurde gerade in der App bearbeitet: Index neu aufbauen und noch einmal
+                    self._matcher = None
+                    if attempt == MAX_RETRIES - 1: raise
+                    continue
+                except BaseException:
+                    # Der Index enthält schon die nicht gespeicherten neuen Zeilen
+                    self._matcher = None
+                    raise
+                self._matcher.add(upserts)
+                # Stand vor und nach dem eigenen Schreiben, unter der Schreibsperre gelesen. Hat
+                # seit dem Indexaufbau jemand anderes geschrieben, passt der Index nicht mehr.
+                if written is not None:
+                    if written[0] == self._signature: self._signature = written[1]
+                    else: self._matcher = None
+                return {"neu": added, "aktualisiert": updated, "unveraendert": unchanged}
@@ -0,0 +1,109 @@
+"""Spaltenweise Normalisierung der Standortdaten (Koordinaten, Status, Texte)."""
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
+
+COLUMNS = ["id", "nummer", "bundesnummer", "strasse", "plz", "stadt", "typ", "letzte_kontrolle", "breitengrad", "laengengrad", "bild_pfad", "baujahr", "hersteller", "status"]
+TEXT_COLUMNS = ["nummer", "bundesnummer", "plz", "strasse", "stadt", "typ", "bild_pfad", "baujahr", "hersteller"]
+DEFAULT_STATUS = "Funktionstüchtig"
+_EMPTY_MARKERS = ["nan", "Nan", "", "None"]
+# Dezimalzahl (nach Komma -> Punkt), wie float() sie liest. Nur ASCII-Ziffern und ohne
+# Leerzeichen: der Rest (leer, "k.A.", "inf", " 52.5", "1_000" ...) geht durch safe_float.
+_NUMBER = r"[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?"
+
+
+# WICHTIGE HILFSFUNKTION: Rettet Zahlen mit Kommas
+def safe_float(val):
+    if val is None: return 0.0
+    try:
+        # String säubern: Komma zu Punkt, Leerzeichen weg
+        clean_val = str(val).replace(',', '.').strip()
+        return float(clean_val)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+# pandas 3 mit pyarrow: dtype=str/astype(str) liefern Arrow-Strings. Nur darauf lohnen sich die
+# gesammelten String-Operationen; auf Objekt-Strings läuft z.B. str.fullmatch ohnehin einmal
+# Python je Zelle, dort bleibt es bei numpy bzw. safe_float.
+_ARROW_STRINGS = getattr(pd.Series([""], dtype=object).astype(str).dtype, "storage", None) == "pyarrow"
+
+
+def parse_coords(values):
+    # Wie safe_float, aber für eine ganze Spalte: ein Regex-Durchlauf trennt gültige Zahlen
+    # ab, die pyarrow gesammelt umwandelt (korrekt gerundet wie float(), bitgleich). Nur
+    # leere Zellen und Müll laufen einzeln durch safe_float. Ohne Arrow-Strings wie bisher.
+    s = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+    if is_numeric_dtype(s.dtype) and not is_bool_dtype(s.dtype):
+        return s.astype("float64")
+    if not _ARROW_STRINGS:
+        return s.apply(safe_float).astype("float64")
+
+    text = s.astype(str).str.replace(",", ".", regex=False)
+    valid = text.str.fullmatch(_NUMBER).fillna(False).to_numpy(dtype=bool)
+    out = np.empty(len(s), dtype="float64")
+    if valid.any():
+        out[valid] = text[valid].astype("float64[pyarrow]").to_numpy(dtype="float64")
+    rest = ~valid
+    if rest.any():
+        out[rest] = [safe_float(v) for v in s[rest].to_numpy(dtype=object)]
+    return pd.Series(out, index=s.index, name=s.name)
+
+
+def _clean_status(val):
+    text = str(val).strip()
+    if val in _EMPTY_MARKERS or text in _EMPTY_MARKERS: return DEFAULT_STATUS
+    return text.capitalize()
+
+
+def normalize_status(values):
+    # Leere/kaputte Werte -> Standardstatus, sonst "defekt" -> "Defekt".
+    # Es gibt nur eine Handvoll verschiedener Werte, daher nur diese säubern und per take
+    # verteilen: ohne Objekt-Array, das danach noch einmal in Strings gewandelt werden müsste.
+    codes, uniques = pd.factorize(values)
+    cleaned = pd.array([_clean_status(u) for u in uniques] + [DEFAULT_STATUS], dtype="str")
+    return pd.Series(cleaned.take(codes), index=values.index, name=values.name)
+
+
+def normalize_text(values):
+    # NaN und "nan"-Strings werden zu "", alles andere bleibt String.
+    if not _ARROW_STRINGS:
+        # Objekt-Strings: Masken direkt auf dem numpy-Array, das ist ein Bruchteil von replace
+        out = values.to_numpy(dtype=object)
+        blank = pd.isna(out) | (out == "nan") | (out == "Nan")
+        if blank.any():
+            out = out.copy()
+            out[blank] = ""
+        return pd.Series(out, index=values.index, name=values.name).astype(str)
+    # Auf dem Array statt der Series: Series.fillna/mask kosten ein Mehrfaches.
+    # Erst NaN füllen: der Vergleich auf einem Array ohne NaN ist billiger als isin.
+    out = values.astype(str).array
+    if out.isna().any(): out = out.fillna("")
+    nan_text = np.asarray(out == "nan", dtype=bool) | np.asarray(out == "Nan", dtype=bool)
+    if nan_text.any():
+        out = out.copy()
+        out[nan_text] = ""
+    return pd.Series(out, index=values.index, name=values.name)
+
+
+def parse_dates(values):
+    # Jedes Datum kommt tausendfach vor: nur die eindeutigen Werte parsen
+    codes, uniques = pd.factorize(values)
+    dates = np.asarray(pd.to_datetime(pd.Series(uniques, dtype=object), errors='coerce').dt.date, dtype=object)
+    out = np.append(dates, pd.NaT)[codes]
+    return pd.Series(out, index=values.index, name=values.name, dtype=object)
+
+
+def normalize_frame(df):
+    # Normalisiert einen frisch gelesenen (dtype=str) DataFrame spaltenweise an Ort und Stelle
+    for col in COLUMNS:
+        if col not in df.columns: df[col] = ""
+
+    df["status"] = normalize_status(df["status"])
+    df["breitengrad"] = parse_coords(df["breitengrad"])
+    df["laengengrad"] = parse_coords(df["laengengrad"])
+    for col in TEXT_COLUMNS:
+        df[col] = normalize_text(df[col])
+
+    df["letzte_kontrolle"] = parse_dates(df["letzte_kontrolle"])
+    return df
@@ -0,0 +1,64 @@
+"""Zeitmessung für die teuren Schritte eines Reruns (Laden, Liste, Karte, Bilder, Speichern ...).
+
+Jeder Schritt legt Dauer und optional Nutzlast (Bytes, z.B. Karten-HTML oder
+Base64-Bilder) ab; behalten werden je Schritt die letzten ``maxlen`` Messungen.
+Die Messung selbst kostet nur zwei perf_counter-Aufrufe. Ein Objekt wird von
+allen Sitzungen geteilt (Streamlit: cache_resource) und ist thread-sicher.
+Auch die Benchmarks (benchmarks/run_all.py) sammeln ihre Zeiten hiermit.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+PERCENTILES = [50, 90, 99]
+
+
+class PerfLog:
+    def __init__(self, maxlen=500):
+        self.maxlen = maxlen
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=self.maxlen))
+
+    def record(self, stage, seconds, nbytes=None):
+        with self._lock:
+            self._samples[stage].append((time.time(), seconds, nbytes))
+
+    @contextmanager
+    def timed(self, stage):
+        # with perf.timed("karte") as sample: ...; sample["bytes"] = len(html)
+        sample = {"bytes": None}
+        t0 = time.perf_counter()
+        try:
+            yield sample
+        finally:
+            # Auch bei st.rerun() (Ausnahme) mitzählen: die Zeit ist trotzdem angefallen
+            self.record(stage, time.perf_counter() - t0, sample["bytes"])
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+    def samples(self, stage):
+        with self._lock:
+            return list(self._samples.get(stage, ()))
+
+    def summary(self):
+        # Je Schritt: Anzahl, Perzentile und Maximum in ms, mittlere und größte Nutzlast
+        with self._lock:
+            stages = {stage: list(values) for stage, values in self._samples.items()}
+        rows = []
+        for stage, values in stages.items():
+            ms = np.array([v[1] for v in values]) * 1000
+            sizes = np.array([v[2] for v in values if v[2] is not None], dtype="float64")
+            row = {"schritt": stage, "anzahl": len(ms)}
+            row.update({f"p{p}_ms": float(np.percentile(ms, p)) for p in PERCENTILES})
+            row["max_ms"] = float(ms.max())
+            row["bytes_mittel"] = float(sizes.mean()) if len(sizes) else np.nan
+            row["bytes_max"] = float(sizes.max()) if len(sizes) else np.nan
+            rows.append(row)
+        columns = ["schritt", "anzahl"] + [f"p{p}_ms" for p in PERCENTILES] + ["max_ms", "bytes_mittel", "bytes_max"]
+        return pd.DataFrame(rows, columns=columns).sort_values("p50_ms", ascending=False, ignore_index=True)
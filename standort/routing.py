@@ -0,0 +1,132 @@
+"""Tourenplanung für Prüfer: Besuchsreihenfolge über Luftlinien-Entfernungen, ganz ohne Netz.
+
+Ablauf: Entfernungsmatrix (vektorisiert), Nächster-Nachbar-Tour ab dem Start,
+dann 2-opt bis keine Verbesserung mehr kommt oder das Zeitbudget aufgebraucht
+ist. Bei mehreren Technikern wird eine Gesamttour nach Länge in gleich große
+Abschnitte geteilt und jeder Abschnitt ab dem Start neu optimiert.
+
+Die Matrix wächst quadratisch (3000 Stopps: rund 400 MB Spitze), daher plant
+``plan_routes`` höchstens ``MAX_STOPS`` Stopps; ``most_urgent`` wählt vorher
+die dringendsten aus.
+"""
+import datetime
+import time
+
+import numpy as np
+import pandas as pd
+
+from standort.mapview import geocoded
+from standort.spatial import haversine_m
+
+OVERDUE_DAYS = 365
+MAX_STOPS = 3000
+
+
+def route_candidates(df, defekt=True, overdue_days=OVERDUE_DAYS, today=None):
+    # Standorte mit Koordinaten, die defekt sind oder deren letzte Kontrolle zu lange her ist.
+    # Ohne Datum gilt ein Standort als überfällig. overdue_days=None: nur Defekt.
+    df = geocoded(df)
+    mask = np.zeros(len(df), dtype=bool)
+    if defekt: mask |= (df["status"] == "Defekt").to_numpy(dtype=bool)
+    if overdue_days is not None:
+        cutoff = pd.Timestamp(today or datetime.date.today()) - pd.Timedelta(days=overdue_days)
+        checked = pd.to_datetime(df["letzte_kontrolle"], errors="coerce")
+        mask |= (checked.isna() | (checked < cutoff)).to_numpy(dtype=bool)
+    return df[mask]
+
+
+def most_urgent(stops, limit=MAX_STOPS):
+    # Höchstens limit Stopps: zuerst Defekte, dann die am längsten nicht kontrollierten (ohne Datum zuerst)
+    if len(stops) <= limit: return stops
+    defekt = (stops["status"] == "Defekt").to_numpy(dtype=bool)
+    checked = pd.to_datetime(stops["letzte_kontrolle"], errors="coerce").to_numpy(dtype="datetime64[ns]")
+    order = np.lexsort((checked.astype("int64"), ~np.isnat(checked), ~defekt))
+    return stops.iloc[np.sort(order[:limit])]
+
+
+def distance_matrix(lat, lon):
+    # n x n Luftlinien-Entfernungen in Metern
+    lat = np.asarray(lat, dtype="float64")
+    lon = np.asarray(lon, dtype="float64")
+    return haversine_m(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+
+
+def nearest_neighbour(dist, start=0):
+    # Immer zum nächsten noch nicht besuchten Punkt
+    n = len(dist)
+    tour = np.empty(n, dtype="int64")
+    tour[0] = start
+    visited = np.zeros(n, dtype=bool)
+    visited[start] = True
+    for pos in range(1, n):
+        row = np.where(visited, np.inf, dist[tour[pos - 1]])
+        tour[pos] = int(np.argmin(row))
+        visited[tour[pos]] = True
+    return tour
+
+
+def path_length(tour, dist):
+    return float(dist[tour[:-1], tour[1:]].sum()) if len(tour) > 1 else 0.0
+
+
+def two_opt(tour, dist, time_limit=5.0):
+    # Offener Weg ab tour[0] (der Start bleibt vorn, das Ende ist frei).
+    # Für jedes i werden alle Umkehrungen tour[i..j] auf einmal bewertet.
+    tour = np.array(tour, dtype="int64")
+    n = len(tour)
+    if n < 4: return tour
+    # Zusatzknoten n mit Entfernung 0: "hinter dem letzten Stopp" kostet nichts
+    ext = np.zeros((n + 1, n + 1))
+    ext[:n, :n] = dist
+    deadline = time.perf_counter() + time_limit
+    t = np.append(tour, n)
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(1, n - 1):
+            a, b = t[i - 1], t[i]
+            c, d = t[i + 1:n], t[i + 2:n + 1]
+            delta = ext[a, c] + ext[b, d] - ext[a, b] - ext[c, d]
+            j = int(np.argmin(delta))
+            if delta[j] < -1e-7:
+                t[i:i + j + 2] = t[i:i + j + 2][::-1].copy()
+                improved = True
+            if time.perf_counter() >= deadline: break
+    return t[:n]
+
+
+def _split_points(tour, dist, parts):
+    # Schnittstellen, an denen die Gesamttour (ohne Start) etwa gleich lange Stücke ergibt
+    legs = dist[tour[:-1], tour[1:]]
+    cum = np.concatenate([[0.0], np.cumsum(legs)])[1:]  # Weg bis zu jedem Stopp
+    targets = cum[-1] * np.arange(1, parts) / parts
+    cuts = np.searchsorted(cum, targets) + 1
+    return np.unique(np.clip(cuts, 1, len(tour) - 1))
+
+
+def plan_routes(stops, start, technicians=1, time_limit=5.0):
+    # stops: DataFrame mit breitengrad/laengengrad (z.B. aus route_candidates), start: (lat, lon).
+    # Ergebnis: eine Liste pro Techniker mit Einträgen der Zeilen in Besuchsreihenfolge
+    # plus Streckenlänge in Metern: [(DataFrame, meter), ...]
+    if stops.empty: return []
+    if len(stops) > MAX_STOPS:
+        raise ValueError(f"Zu viele Stopps für eine Planung: {len(stops)} (höchstens {MAX_STOPS})")
+    lat = np.concatenate([[start[0]], stops["breitengrad"].to_numpy(dtype="float64")])
+    lon = np.concatenate([[start[1]], stops["laengengrad"].to_numpy(dtype="float64")])
+    dist = distance_matrix(lat, lon)
+    technicians = max(1, min(int(technicians), len(stops)))
+    budget = time_limit / (technicians + 1) if technicians > 1 else time_limit
+    tour = two_opt(nearest_neighbour(dist, 0), dist, budget)
+    if technicians == 1:
+        groups = [tour[1:]]
+    else:
+        cuts = _split_points(tour, dist, technicians)
+        groups = [g for g in np.split(tour[1:], cuts - 1) if len(g)]
+    routes = []
+    for group in groups:
+        nodes = np.concatenate([[0], group])
+        sub = dist[np.ix_(nodes, nodes)]
+        order = two_opt(nearest_neighbour(sub, 0), sub, budget) if technicians > 1 else np.arange(len(nodes))
+        visit = nodes[order]
+        routes.append((stops.iloc[visit[1:] - 1], path_length(visit, dist)))
+    return routes
@@ -0,0 +1,158 @@
+"""Gitter-Index über die Koordinaten für Umkreis- und Nächste-Nachbarn-Abfragen.
+
+Die Standorte werden in quadratische Zellen (Standard 250 m) einsortiert. Eine
+Abfrage sieht nur die Zellen rund um den Suchpunkt an und rechnet die genaue
+Entfernung (Haversine) nur für diese Kandidaten, statt über alle Zeilen.
+``sync`` gleicht den Index mit einem neuen Datenstand ab und fasst dabei nur
+Standorte an, die neu, gelöscht oder verschoben sind.
+"""
+import math
+import threading
+
+import numpy as np
+import pandas as pd
+
+from standort.mapview import geocoded
+
+EARTH_RADIUS_M = 6371008.8
+CELL_METERS = 250
+_M_PER_DEG_LAT = 111320.0
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    # Entfernung in Metern, vektorisiert (Skalare und numpy-Arrays, broadcastbar)
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype="float64")) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class SpatialIndex:
+    def __init__(self, cell_m=CELL_METERS):
+        self.cell_m = cell_m
+        self._lock = threading.Lock()
+        self._version = object()  # passt zu keiner echten Signatur
+        self._coords = pd.DataFrame({"lat": pd.Series(dtype="float64"), "lon": pd.Series(dtype="float64")}, index=pd.Index([], dtype=object))
+        self._members = {}  # (cx, cy) -> {id: (lat, lon)}
+        self._arrays = {}  # (cx, cy) -> (ids, lat, lon), aus _members abgeleitet
+        self._bounds = None  # (min cx, min cy, max cx, max cy) der belegten Zellen
+        self._lat0 = None
+        self._m_per_deg_lon = None
+
+    def __len__(self):
+        return len(self._coords)
+
+    def _cells(self, lat, lon):
+        # Lokale Projektion (Breite des ersten Datenstands fest), reicht für eine Stadt
+        cy = np.floor(np.asarray(lat, dtype="float64") * _M_PER_DEG_LAT / self.cell_m).astype("int64")
+        cx = np.floor(np.asarray(lon, dtype="float64") * self._m_per_deg_lon / self.cell_m).astype("int64")
+        return cx, cy
+
+    def sync(self, df, version=None):
+        # Gleicht den Index mit df ab; gibt die Zahl geänderter Standorte zurück.
+        # Mit version (z.B. storage.signature()) kostet ein unveränderter Stand nichts.
+        if version is not None and version == self._version: return 0
+        valid = geocoded(df)
+        new = pd.DataFrame({"lat": valid["breitengrad"].to_numpy(dtype="float64"), "lon": valid["laengengrad"].to_numpy(dtype="float64")}, index=pd.Index(valid["id"].astype(str).to_numpy(dtype=object)))
+        new = new[~new.index.duplicated()]
+        with self._lock:
+            if self._lat0 is None:
+                if new.empty:
+                    self._version = version if version is not None else object()
+                    return 0
+                self._lat0 = float(new["lat"].median())
+                self._m_per_deg_lon = _M_PER_DEG_LAT * math.cos(math.radians(self._lat0))
+            old = self._coords
+            if new.index.equals(old.index):
+                # Häufigster Fall nach dem Speichern: gleiche Zeilen, einzelne Koordinaten anders
+                changed = np.flatnonzero((new.to_numpy() != old.to_numpy()).any(axis=1))
+                leaving, entering, n_moved = old.iloc[changed], new.iloc[changed], len(changed)
+            else:
+                aligned = old.reindex(new.index)
+                changed = (aligned.to_numpy() != new.to_numpy()).any(axis=1)
+                moved = changed & aligned["lat"].notna().to_numpy()
+                entering, n_moved = new[changed], int(moved.sum())
+                leaving = old.loc[old.index.difference(new.index).append(new.index[moved])]
+            touched = set()
+            for key, id_ in zip(zip(*(c.tolist() for c in self._cells(leaving["lat"], leaving["lon"]))), leaving.index):
+                self._members[key].pop(id_, None)
+                touched.add(key)
+            cx, cy = self._cells(entering["lat"], entering["lon"])
+            for key, id_, lat, lon in zip(zip(cx.tolist(), cy.tolist()), entering.index, entering["lat"].tolist(), entering["lon"].tolist()):
+                self._members.setdefault(key, {})[id_] = (lat, lon)
+                touched.add(key)
+            for key in touched:
+                self._arrays.pop(key, None)
+                if not self._members.get(key): self._members.pop(key, None)
+            if touched:
+                keys = np.array(list(self._members), dtype="int64").reshape(-1, 2)
+                self._bounds = (*keys.min(axis=0).tolist(), *keys.max(axis=0).tolist()) if len(keys) else None
+            self._coords = new
+            self._version = version if version is not None else object()
+        return len(leaving) + len(entering) - n_moved
+
+    def _cell_arrays(self, key):
+        arrays = self._arrays.get(key)
+        if arrays is None:
+            members = self._members[key]
+            coords = np.array(list(members.values()), dtype="float64").reshape(-1, 2)
+            arrays = (np.array(list(members), dtype=object), coords[:, 0], coords[:, 1])
+            self._arrays[key] = arrays
+        return arrays
+
+    def _candidates(self, keys):
+        parts = [self._cell_arrays(k) for k in keys if k in self._members]
+        if not parts: return np.array([], dtype=object), np.array([]), np.array([])
+        return tuple(np.concatenate(p) for p in zip(*parts))
+
+    def within(self, lat, lon, radius_m):
+        # Alle Standorte im Umkreis, nach Entfernung sortiert: [(id, meter), ...]
+        if self._lat0 is None: return []
+        cx, cy = (int(v) for v in self._cells(lat, lon))
+        # Projektion weicht am Rand der Stadt etwas ab, daher eine Zelle Reserve
+        r = int(math.ceil(radius_m / self.cell_m)) + 1
+        with self._lock:
+            if (2 * r + 1) ** 2 > len(self._members):
+                keys = list(self._members)
+            else:
+                keys = [(x, y) for x in range(cx - r, cx + r + 1) for y in range(cy - r, cy + r + 1)]
+            ids, lats, lons = self._candidates(keys)
+        dist = haversine_m(lat, lon, lats, lons)
+        hit = np.flatnonzero(dist <= radius_m)
+        hit = hit[np.argsort(dist[hit], kind="stable")]
+        return list(zip(ids[hit].tolist(), dist[hit].tolist()))
+
+    def nearest(self, lat, lon, k=5, max_m=None):
+        # Die k nächsten Standorte: [(id, meter), ...]. Sucht Ring um Ring nach außen,
+        # bis k Treffer sicher näher liegen als alles, was außerhalb noch kommen kann.
+        if self._lat0 is None or k <= 0: return []
+        cx, cy = (int(v) for v in self._cells(lat, lon))
+        with self._lock:
+            if self._bounds is None: return []
+            min_x, min_y, max_x, max_y = self._bounds
+            max_ring = max(cx - min_x, max_x - cx, cy - min_y, max_y - cy) + 1
+            if max_m is not None: max_ring = min(max_ring, int(math.ceil(max_m / self.cell_m)) + 1)
+            found_ids, found_dist = [], []
+            for ring in range(max_ring + 1):
+                if (2 * ring + 1) ** 2 >= 4 * len(self._members):
+                    # Weit außerhalb oder dünn besetzt: restliche Zellen auf einmal
+                    ids, lats, lons = self._candidates([key for key in self._members if max(abs(key[0] - cx), abs(key[1] - cy)) >= ring])
+                    found_ids.append(ids)
+                    found_dist.append(haversine_m(lat, lon, lats, lons))
+                    break
+                if ring == 0:
+                    keys = [(cx, cy)]
+                else:
+                    keys = [(x, y) for x in range(cx - ring, cx + ring + 1) for y in (cy - ring, cy + ring)]
+                    keys += [(x, y) for x in (cx - ring, cx + ring) for y in range(cy - ring + 1, cy + ring)]
+                ids, lats, lons = self._candidates(keys)
+                if len(ids):
+                    found_ids.append(ids)
+                    found_dist.append(haversine_m(lat, lon, lats, lons))
+                    # Alles innerhalb von ring * Zellgröße ist jetzt gesehen (eine Zelle Reserve)
+                    if ring >= 1 and sum(int((d <= (ring - 1) * self.cell_m).sum()) for d in found_dist) >= k: break
+        if not found_ids: return []
+        ids, dist = np.concatenate(found_ids), np.concatenate(found_dist)
+        order = np.argsort(dist, kind="stable")
+        if max_m is not None: order = order[dist[order] <= max_m]
+        order = order[:k]
+        return list(zip(ids[order].tolist(), dist[order].tolist()))
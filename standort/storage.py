@@ -0,0 +1,401 @@
+"""Speicher-Backends für die Standortdaten.
+
+Beide Backends haben dieselbe Schnittstelle (load/get/get_many/insert/update/
+delete/apply_changes/replace_all/signature). ``open_storage`` wählt über
+``STANDORT_STORAGE`` ("sqlite", Standard, oder "csv"). Die SQLite-Datenbank
+übernimmt beim ersten Öffnen den Inhalt einer vorhandenen locations.csv (einmalig,
+vermerkt in der Tabelle meta); die CSV bleibt als Sicherung liegen.
+
+Mehrere Bearbeiter gleichzeitig: Schreibzugriffe laufen unter einer Sperre
+(CSV: Lock-Datei + atomares Ersetzen, SQLite: BEGIN IMMEDIATE). Wer eine Zeile
+ändern will, kann die Prüfsumme (``row_etags``) der Zeile mitgeben, wie er sie
+gesehen hat. Hat sich die Zeile seitdem geändert, gibt es einen ConflictError
+und nichts wird geschrieben; Änderungen anderer an anderen Zeilen bleiben erhalten.
+"""
+import datetime
+import os
+import sqlite3
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from standort.normalize import COLUMNS, normalize_frame, normalize_status, parse_coords
+
+CSV_FILE = 'data/locations.csv'
+DB_FILE = 'data/locations.sqlite'
+COORD_COLUMNS = ["breitengrad", "laengengrad"]
+
+
+class ConflictError(Exception):
+    # Zeilen wurden seit dem Laden von jemand anderem geändert oder gelöscht
+    def __init__(self, ids):
+        self.ids = [str(i) for i in ids]
+        super().__init__(f"Zwischenzeitlich geändert: {', '.join(self.ids)}")
+
+
+def new_site_id():
+    # Zeitstempel zum Sortieren/Lesen, Zufallsteil gegen Kollisionen (zwei Nutzer in derselben Sekunde)
+    return datetime.datetime.now().strftime('%Y%m%d%H%M%S') + "-" + uuid.uuid4().hex[:8]
+
+
+def row_etags(df):
+    # Prüfsumme je Zeile über den normalisierten Inhalt: {id: int}.
+    # Typunabhängig (str/object/Datum), damit Cache, Datei und Datenbank gleiche Werte liefern.
+    if df is None or df.empty: return {}
+    canon = {}
+    for col in COLUMNS:
+        values = df[col] if col in df.columns else pd.Series("", index=df.index)
+        if col in COORD_COLUMNS:
+            canon[col] = pd.to_numeric(values, errors="coerce").to_numpy(dtype="float64")
+        else:
+            canon[col] = values.astype(object).fillna("").astype(str).to_numpy(dtype=object)
+    hashes = pd.util.hash_pandas_object(pd.DataFrame(canon), index=False)
+    return dict(zip(df["id"].astype(str), hashes.tolist()))
+
+
+def _check_expected(current, expected):
+    # current: aktuelle Zeilen der betroffenen ids; expected: {id: etag} aus Sicht des Aufrufers
+    if not expected: return
+    now = row_etags(current)
+    conflicts = [i for i, tag in expected.items() if tag is not None and now.get(str(i)) != tag]
+    if conflicts: raise ConflictError(conflicts)
+
+
+def _prepare(df):
+    # Status und Koordinaten vor dem Schreiben säubern (wie bisher in save_data)
+    df = df.copy()
+    for col in COLUMNS:
+        if col not in df.columns: df[col] = ""
+    df["status"] = normalize_status(df["status"])
+    df["breitengrad"] = parse_coords(df["breitengrad"])
+    df["laengengrad"] = parse_coords(df["laengengrad"])
+    return df
+
+
+class CsvStorage:
+    # Bisheriges Dateiformat; Änderungen schreiben die ganze Datei (atomar, unter Sperre)
+    name = "csv"
+    _thread_lock = threading.Lock()
+
+    def __init__(self, path=CSV_FILE):
+        self.path = path
+        self._memo = (None, None)  # (signature, DataFrame) des zuletzt gelesenen Stands
+        if not os.path.exists(path):
+            with self._locked():
+                if not os.path.exists(path):
+                    self._write(pd.DataFrame(columns=COLUMNS))
+
+    @contextmanager
+    def _locked(self):
+        # Exklusive Sperre über Prozesse (flock auf <datei>.lock) und Threads hinweg
+        with self._thread_lock, open(self.path + ".lock", "a+") as fh:
+            if fcntl: fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl: fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _write(self, df):
+        # Erst in eine temporäre Datei, dann umbenennen: nie eine halbe locations.csv
+        folder = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".locations-", suffix=".csv", dir=folder)
+        try:
+            with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+                _prepare(df).to_csv(f, index=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+            raise
+
+    def signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _read(self):
+        sig = self.signature()
+        if self._memo[0] is None or self._memo[0] != sig:
+            try:
+                # Alles als String laden
+                df = normalize_frame(pd.read_csv(self.path, dtype=str))
+            except (OSError, ValueError):
+                df = pd.DataFrame(columns=COLUMNS)
+            self._memo = (sig, df)
+        return self._memo[1]
+
+    def load(self):
+        return self._read().copy()
+
+    def get(self, entry_id):
+        df = self._read()
+        hit = df[df["id"] == entry_id]
+        return hit.iloc[0] if not hit.empty else None
+
+    def get_many(self, ids):
+        df = self._read()
+        return df[df["id"].isin([str(i) for i in ids])].copy()
+
+    def replace_all(self, df):
+        with self._locked():
+            self._write(df)
+
+    def insert(self, rows):
+        # Neue Zeilen anhängen; vorhandene ids werden übersprungen. Über _write (atomar),
+        # ein Absturz beim Schreiben hinterlässt also nie eine halbe Zeile in locations.csv
+        with self._locked():
+            df = self._read()
+            rows = _prepare(rows)
+            rows["id"] = rows["id"].astype(str)
+            rows = rows[~rows["id"].isin(df["id"])].drop_duplicates("id")
+            if rows.empty: return 0
+            self._write(pd.concat([df, rows[COLUMNS]], ignore_index=True))
+        return len(rows)
+
+    def update(self, entry_id, fields, expected=None):
+        with self._locked():
+            df = self._read().copy()
+            mask = df["id"] == entry_id
+            if expected is not None: _check_expected(df[mask], {entry_id: expected})
+            for col, val in fields.items():
+                df.loc[mask, col] = val
+            self._write(df)
+        return int(mask.sum())
+
+    def apply_changes(self, upserts=None, deletes=(), expected=None, inserts=None):
+        # upserts: ganze Zeilen (geändert oder neu), deletes: ids, expected: {id: etag},
+        # inserts: nur neue Zeilen; gibt es eine id schon, ConflictError statt Überschreiben.
+        # -> (signature vorher, signature nachher), beide unter der Sperre gelesen; None ohne Änderung
+        deletes = [str(i) for i in deletes]
+        has_inserts = inserts is not None and not inserts.empty
+        if not deletes and (upserts is None or upserts.empty) and not has_inserts: return None
+        with self._locked():
+            before = self.signature()
+            df = self._read().copy()
+            if expected: _check_expected(df[df["id"].isin(list(expected))], expected)
+            if has_inserts:
+                taken = df.loc[df["id"].isin(inserts["id"].astype(str)), "id"]
+                if len(taken): raise ConflictError(taken)
+                upserts = inserts if upserts is None or upserts.empty else pd.concat([upserts, inserts], ignore_index=True)
+            df = df[~df["id"].isin(deletes)]
+            if upserts is not None and not upserts.empty:
+                up = _prepare(upserts)
+                up["id"] = up["id"].astype(str)
+                mask = df["id"].isin(up["id"])
+                repl = up.set_index("id").reindex(df.loc[mask, "id"])
+                for col in COLUMNS[1:]:
+                    df.loc[mask, col] = repl[col].to_numpy()
+                df = pd.concat([df, up[~up["id"].isin(df["id"])]], ignore_index=True)
+            self._write(df)
+            return before, self.signature()
+
+    def delete(self, ids):
+        ids = [str(i) for i in ids]
+        n = int(self._read()["id"].isin(ids).sum())
+        self.apply_changes(deletes=ids)
+        return n
+
+
+def _sql_value(col, val):
+    # pandas/Python-Werte -> SQLite (Datum als ISO-Text, NaN/NaT als NULL)
+    if val is None or (not isinstance(val, str) and pd.isna(val)): return None
+    if col in COORD_COLUMNS: return float(val)
+    if isinstance(val, (datetime.date, pd.Timestamp)): return val.isoformat()[:10]
+    return str(val)
+
+
+class SqliteStorage:
+    # Zeilenweise Schreibzugriffe; Indizes auf id, nummer, status und plz
+    name = "sqlite"
+
+    def __init__(self, path=DB_FILE, migrate_from=CSV_FILE):
+        self.path = path
+        with self._connect() as conn:
+            cols = ", ".join(f"{c} REAL" if c in COORD_COLUMNS else f"{c} TEXT" for c in COLUMNS if c != "id")
+            conn.execute(f"CREATE TABLE IF NOT EXISTS locations (id TEXT PRIMARY KEY, {cols})")
+            for col in ("nummer", "status", "plz"):
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_locations_{col} ON locations ({col})")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0)")
+        if migrate_from: migrate_csv_to_sqlite(migrate_from, self)
+
+    @contextmanager
+    def _connect(self):
+        # Eine Verbindung pro Vorgang: funktioniert aus Streamlit-Threads, Import-Jobs und CLI.
+        # Der Block läuft als eine Transaktion.
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _bump(self, conn):
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+    def _version(self, conn):
+        return conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def signature(self):
+        with self._connect() as conn:
+            return self._version(conn)
+
+    def _frame(self, sql, params=(), conn=None):
+        if conn is None:
+            with self._connect() as conn:
+                df = pd.read_sql_query(sql, conn, params=params)
+        else:
+            df = pd.read_sql_query(sql, conn, params=params)
+        return normalize_frame(df.reindex(columns=COLUMNS))
+
+    def _rows_by_id(self, conn, ids):
+        ids = [str(i) for i in ids]
+        frames = [self._frame(f"SELECT {', '.join(COLUMNS)} FROM locations WHERE id IN ({', '.join('?' * len(chunk))})", chunk, conn) for chunk in (ids[i:i + 500] for i in range(0, len(ids), 500))]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=COLUMNS)
+
+    def load(self):
+        return self._frame(f"SELECT {', '.join(COLUMNS)} FROM locations ORDER BY rowid")
+
+    def get(self, entry_id):
+        # Index-Lookup über den Primärschlüssel statt Scan über den DataFrame
+        df = self._frame(f"SELECT {', '.join(COLUMNS)} FROM locations WHERE id = ?", (str(entry_id),))
+        return df.iloc[0] if not df.empty else None
+
+    def get_many(self, ids):
+        with self._connect() as conn:
+            return self._rows_by_id(conn, ids)
+
+    def _rows(self, df):
+        df = _prepare(df)
+        return [tuple(_sql_value(col, val) for col, val in zip(COLUMNS, rec)) for rec in df[COLUMNS].itertuples(index=False, name=None)]
+
+    def replace_all(self, df):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM locations")
+            conn.executemany(f"INSERT OR REPLACE INTO locations ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", self._rows(df))
+            self._bump(conn)
+
+    def insert(self, rows):
+        if rows.empty: return 0
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(f"INSERT OR IGNORE INTO locations ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", self._rows(rows))
+            added = conn.total_changes - before
+            if added: self._bump(conn)
+        return added
+
+    def update(self, entry_id, fields, expected=None):
+        if not fields: return 0
+        fields = dict(fields)
+        unknown = set(fields) - set(COLUMNS)
+        if unknown: raise ValueError(f"Unbekannte Spalten: {', '.join(sorted(unknown))}")
+        if "status" in fields: fields["status"] = normalize_status(pd.Series([fields["status"]]))[0]
+        for col in COORD_COLUMNS:
+            if col in fields: fields[col] = float(parse_coords(pd.Series([fields[col]], dtype=object))[0])
+        assignments = ", ".join(f"{col} = ?" for col in fields)
+        params = [_sql_value(col, val) for col, val in fields.items()] + [str(entry_id)]
+        with self._connect() as conn:
+            # Schreibsperre vor dem Prüfen holen, sonst kann sich die Zeile dazwischen ändern
+            conn.execute("BEGIN IMMEDIATE")
+            if expected is not None: _check_expected(self._rows_by_id(conn, [entry_id]), {entry_id: expected})
+            changed = conn.execute(f"UPDATE locations SET {assignments} WHERE id = ?", params).rowcount
+            if changed: self._bump(conn)
+        return changed
+
+    def apply_changes(self, upserts=None, deletes=(), expected=None, inserts=None):
+        # upserts: ganze Zeilen (geändert oder neu), deletes: ids, expected: {id: etag},
+        # inserts: nur neue Zeilen; gibt es eine id schon, ConflictError statt Überschreiben
+        deletes = [str(i) for i in deletes]
+        rows = self._rows(upserts) if upserts is not None and not upserts.empty else []
+        new_rows = self._rows(inserts) if inserts is not None and not inserts.empty else []
+        if not deletes and not rows and not new_rows: return None
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            before = self._version(conn)
+            if expected: _check_expected(self._rows_by_id(conn, list(expected)), expected)
+            if new_rows:
+                taken = self._rows_by_id(conn, [r[0] for r in new_rows])
+                if not taken.empty: raise ConflictError(taken["id"])
+                conn.executemany(f"INSERT INTO locations ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", new_rows)
+            if deletes: conn.executemany("DELETE FROM locations WHERE id = ?", [(i,) for i in deletes])
+            if rows:
+                # UPSERT behält die rowid und damit die Reihenfolge bestehender Zeilen
+                updates = ", ".join(f"{c} = excluded.{c}" for c in COLUMNS[1:])
+                conn.executemany(f"INSERT INTO locations ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))}) ON CONFLICT(id) DO UPDATE SET {updates}", rows)
+            self._bump(conn)
+        # Unter BEGIN IMMEDIATE schreibt sonst niemand: genau unser Schritt
+        return before, before + 1
+
+    def delete(self, ids):
+        ids = [str(i) for i in ids]
+        if not ids: return 0
+        with self._connect() as conn:
+            changed = conn.executemany("DELETE FROM locations WHERE id = ?", [(i,) for i in ids]).rowcount
+            if changed: self._bump(conn)
+        return changed
+
+
+def _legacy_frame(csv_path):
+    # locations.csv mit der gleichen Normalisierung wie beim Laden.
+    # Fehlende oder doppelte ids (z.B. zwei Importe am selben Tag) bekommen ein Suffix,
+    # damit beim Umzug keine Zeile verloren geht.
+    df = CsvStorage(csv_path).load()
+    ids = df["id"].fillna("").astype(str)
+    bad = (ids == "") | ids.duplicated()
+    if bad.any():
+        used = set(ids)
+        fixed = ids.tolist()
+        for pos in bad.to_numpy().nonzero()[0]:
+            base, n = fixed[pos] or "ohne-id", 2
+            while f"{base}-{n}" in used: n += 1
+            fixed[pos] = f"{base}-{n}"
+            used.add(fixed[pos])
+        df["id"] = fixed
+    return df
+
+
+def _migrated(conn):
+    return conn.execute("SELECT 1 FROM meta WHERE key = 'migrated'").fetchone() is not None
+
+
+def migrate_csv_to_sqlite(csv_path, storage):
+    # Übernimmt eine bestehende locations.csv einmalig. Zeilen und Merker 'migrated' in
+    # einer Transaktion: ein Abbruch hinterlässt keinen halben Umzug, der beim nächsten
+    # Start als erledigt gälte, und zwei Prozesse übernehmen nicht doppelt.
+    with storage._connect() as conn:
+        if _migrated(conn): return 0
+    df = _legacy_frame(csv_path) if os.path.exists(csv_path) else None
+    copied = 0
+    with storage._connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        if _migrated(conn): return 0
+        # Datenbanken von vor dem Merker, die schon Zeilen haben, gelten als übernommen
+        if df is not None and not df.empty and conn.execute("SELECT 1 FROM locations LIMIT 1").fetchone() is None:
+            rows = storage._rows(df)
+            conn.executemany(f"INSERT OR IGNORE INTO locations ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", rows)
+            copied = len(rows)
+            storage._bump(conn)
+        conn.execute("INSERT INTO meta (key, value) VALUES ('migrated', 1)")
+    return copied
+
+
+def open_storage(kind=None):
+    kind = (kind or os.environ.get("STANDORT_STORAGE", "sqlite")).lower()
+    if kind == "csv":
+        return CsvStorage(CSV_FILE)
+    if kind == "sqlite":
+        return SqliteStorage(DB_FILE, migrate_from=CSV_FILE)
+    raise ValueError(f"Unbekanntes Speicher-Backend: {kind}")
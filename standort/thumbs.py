@@ -0,0 +1,72 @@
+"""Kleine Vorschaubilder für Liste und Karte, einmal erzeugt und auf Platte gecacht."""
+import base64
+import glob
+import hashlib
+import os
+import tempfile
+from functools import lru_cache
+
+THUMB_FOLDER = 'data/thumbs'
+THUMB_SIZE = 160  # längste Kante in Pixel
+THUMB_QUALITY = 70
+
+
+def _thumb_prefix(src, size):
+    # Je Quelldatei eindeutig: voller Dateiname (a.jpg und a.png sind verschiedene Fotos) und
+    # ein Hash des Pfads (gleicher Name in verschiedenen Ordnern)
+    source = os.path.abspath(src)
+    return f"{os.path.basename(source)}-{hashlib.sha1(source.encode()).hexdigest()[:8]}-{size}-"
+
+
+def thumbnail_path(src, size=THUMB_SIZE):
+    # Schlüssel aus Pfad + mtime + Größe: ein neues Foto unter gleichem Namen gibt einen neuen Thumbnail
+    stat = os.stat(src)
+    key = hashlib.sha1(f"{os.path.abspath(src)}|{stat.st_mtime_ns}|{stat.st_size}".encode()).hexdigest()[:16]
+    return os.path.join(THUMB_FOLDER, f"{_thumb_prefix(src, size)}{key}.jpg")
+
+
+def ensure_thumbnail(src, size=THUMB_SIZE):
+    # Liefert den Pfad zum Thumbnail und erzeugt ihn bei Bedarf
+    if not src or not os.path.exists(src): return None
+    path = thumbnail_path(src, size)
+    if os.path.exists(path): return path
+
+    # Pillow erst hier: wer nur vorhandene Thumbnails liest, zahlt den Import nicht
+    from PIL import Image, ImageOps
+    os.makedirs(THUMB_FOLDER, exist_ok=True)
+    # Eigene temporäre Datei je Aufruf: zwei Sitzungen, die dasselbe Bild gleichzeitig
+    # verkleinern, schreiben nicht in dieselbe Datei (wie CsvStorage._write)
+    fd, tmp_path = tempfile.mkstemp(prefix=".thumb-", suffix=".tmp", dir=THUMB_FOLDER)
+    try:
+        with os.fdopen(fd, "wb") as f, Image.open(src) as img:
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((size, size))
+            img.convert("RGB").save(f, "JPEG", quality=THUMB_QUALITY, optimize=True)
+        os.replace(tmp_path, path)
+    except (OSError, ValueError):
+        # Kaputtes oder unbekanntes Bildformat: lieber kein Bild als ein Absturz
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        return None
+    except BaseException:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        raise
+
+    # Veraltete Thumbnails desselben Fotos aufräumen
+    for old in glob.glob(os.path.join(THUMB_FOLDER, f"{glob.escape(_thumb_prefix(src, size))}*.jpg")):
+        if old != path:
+            try: os.remove(old)
+            except OSError: pass
+    return path
+
+
+@lru_cache(maxsize=4096)
+def _read_base64(path):
+    # Thumbnail-Pfade enthalten die mtime des Originals, der Cache kann nicht veralten
+    with open(path, "rb") as f:
+        return base64.b64encode(f.read()).decode('utf-8')
+
+
+def thumbnail_base64(src, size=THUMB_SIZE):
+    path = ensure_thumbnail(src, size)
+    if path is None: return None
+    return _read_base64(path)
@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from standort.normalize import COLUMNS  # noqa: E402
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    # Jeder Test in einem eigenen Verzeichnis mit leerem data/, wie die App es anlegt
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data")
+    return tmp_path / "data"
+
+
+def sites(*rows):
+    # Standorte im Format von locations.csv; nicht angegebene Felder leer
+    defaults = {col: "" for col in COLUMNS}
+    defaults.update({"stadt": "Berlin", "breitengrad": 0.0, "laengengrad": 0.0, "status": "Funktionstüchtig"})
+    return pd.DataFrame([{**defaults, **row} for row in rows], columns=COLUMNS)
+
+
+class StubLocation:
+    def __init__(self, latitude, longitude):
+        self.latitude, self.longitude = latitude, longitude
+
+
+class StubGeocoder:
+    # Lokaler Ersatz für Nominatim: feste Antworten, zählt die Anfragen
+    def __init__(self, answers, fail=()):
+        self.answers, self.fail, self.calls = answers, set(fail), []
+
+    def __call__(self, address):
+        self.calls.append(address)
+        if address in self.fail: raise TimeoutError(address)
+        coords = self.answers.get(address)
+        return StubLocation(*coords) if coords else None
@@ -0,0 +1,27 @@
+from conftest import StubGeocoder
+
+from standort.geocache import GeoCache, geocode_cached, geocode_many
+
+
+def test_geocode_many_uses_cache(data_dir):
+    cache = GeoCache(str(data_dir / "geocache.sqlite"))
+    geocoder = StubGeocoder({"Weg 1, 10365 Berlin": (52.5, 13.4)}, fail={"Allee 3, 10367 Berlin"})
+    addresses = ["Weg 1, 10365 Berlin", "weg 1,  10365 berlin", "Nirgends 2, 10315 Berlin", "Allee 3, 10367 Berlin", ""]
+    coords, stats = geocode_many(addresses, geocoder, cache)
+    assert coords == [(52.5, 13.4), (52.5, 13.4), None, None, None]
+    assert stats == {"adressen": 3, "cache": 0, "abgefragt": 3, "fehler": 1}
+    # Gefundene und nicht gefundene Adressen kommen aus dem Cache, Fehler werden erneut gefragt
+    geocoder.calls.clear()
+    coords, stats = geocode_many(addresses, geocoder, cache)
+    assert geocoder.calls == ["Allee 3, 10367 Berlin"]
+    assert stats["cache"] == 2
+    cache.close()
+
+
+def test_negative_entries_expire(data_dir):
+    cache = GeoCache(str(data_dir / "geocache.sqlite"), negative_ttl=0)
+    geocoder = StubGeocoder({})
+    assert geocode_cached("Nirgends 2", geocoder, cache) is None
+    assert geocode_cached("Nirgends 2", geocoder, cache) is None
+    assert len(geocoder.calls) == 2
+    cache.close()
@@ -0,0 +1,107 @@
+import pytest
+from conftest import sites
+
+from standort.matching import BY_ADDRESS, BY_BUNDESNUMMER, BY_NUMMER, MAX_RETRIES, ImportMerger, SiteMatcher
+from standort.storage import ConflictError, SqliteStorage
+
+
+@pytest.fixture
+def storage(data_dir):
+    store = SqliteStorage(str(data_dir / "locations.sqlite"), migrate_from=None)
+    store.replace_all(sites(
+        {"id": "a", "nummer": "N1", "bundesnummer": "B1", "strasse": "Weg 1", "plz": "10365"},
+        {"id": "b", "strasse": "Allee 2", "plz": "10367"},
+    ))
+    return store
+
+
+def test_lookup_ranks():
+    matcher = SiteMatcher(sites({"id": "a", "nummer": "N1", "bundesnummer": "B1", "strasse": "Weg 1", "plz": "10365"}))
+    rows = sites(
+        {"id": "x1", "nummer": "n1"},
+        {"id": "x2", "bundesnummer": "B1"},
+        {"id": "x3", "strasse": "Weg  1", "plz": "10365"},
+        # Andere Nummer: trotz gleicher Adresse ein anderer Standort
+        {"id": "x4", "nummer": "N2", "strasse": "Weg 1", "plz": "10365"},
+    )
+    assert matcher.match(rows) == [("a", BY_NUMMER), ("a", BY_BUNDESNUMMER), ("a", BY_ADDRESS), (None, None)]
+
+
+def test_changed_site_loses_old_keys():
+    matcher = SiteMatcher(sites(
+        {"id": "a", "bundesnummer": "B1", "strasse": "Weg 1", "plz": "10365"},
+        {"id": "b", "bundesnummer": "B1"},
+    ))
+    matcher.add(sites({"id": "a", "bundesnummer": "B2", "strasse": "Weg 2", "plz": "10365"}))
+    rows = sites({"id": "x1", "strasse": "Weg 1", "plz": "10365"}, {"id": "x2", "strasse": "Weg 2", "plz": "10365"},
+                 {"id": "x3", "bundesnummer": "B1"}, {"id": "x4", "bundesnummer": "B2"})
+    # Die alte Bundesnummer gehört jetzt dem nächsten Standort mit diesem Schlüssel
+    assert matcher.match(rows) == [(None, None), ("a", BY_ADDRESS), ("b", BY_BUNDESNUMMER), ("a", BY_BUNDESNUMMER)]
+
+
+def test_exact_match_wins_within_chunk(storage):
+    rows = sites(
+        {"id": "i0", "nummer": "N1", "hersteller": "Nummer"},
+        {"id": "i1", "strasse": "Weg 1", "plz": "10365", "hersteller": "Adresse"},
+        {"id": "i2", "strasse": "Allee 2", "plz": "10367", "hersteller": "erste"},
+        {"id": "i3", "strasse": "Allee 2", "plz": "10367", "hersteller": "letzte"},
+    )
+    counts = ImportMerger(storage).commit(rows)
+    assert counts == {"neu": 0, "aktualisiert": 2, "unveraendert": 0}
+    # Nummer vor Adresse, auch wenn die Adresszeile später kommt; bei gleichem Rang die letzte
+    assert storage.get("a")["hersteller"] == "Nummer"
+    assert storage.get("b")["hersteller"] == "letzte"
+    assert len(storage.load()) == 2
+
+
+def test_new_rows_and_later_chunks(storage):
+    merger = ImportMerger(storage)
+    first = sites({"id": "i0", "nummer": "N9", "strasse": "Neu 1", "plz": "10315"},
+                  {"id": "i1", "nummer": "N9", "hersteller": "Wall"})
+    assert merger.commit(first) == {"neu": 1, "aktualisiert": 0, "unveraendert": 0}
+    assert storage.get("i0")["hersteller"] == "Wall"
+    # Adresse von a geändert: eine spätere Zeile mit der alten Adresse trifft a nicht mehr
+    assert merger.commit(sites({"id": "i2", "nummer": "N1", "strasse": "Weg 3", "plz": "10365"}))["aktualisiert"] == 1
+    assert merger.commit(sites({"id": "i3", "strasse": "Weg 1", "plz": "10365"}))["neu"] == 1
+    assert storage.get("a")["strasse"] == "Weg 3"
+
+
+class FlakyStorage:
+    # Wie SqliteStorage, aber die ersten ``conflicts`` Schreibversuche scheitern
+    def __init__(self, inner, conflicts):
+        self.inner, self.conflicts, self.attempts = inner, conflicts, 0
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def apply_changes(self, *args, **kwargs):
+        self.attempts += 1
+        if self.attempts <= self.conflicts: raise ConflictError(["a"])
+        return self.inner.apply_changes(*args, **kwargs)
+
+
+def test_conflict_is_retried(storage):
+    flaky = FlakyStorage(storage, conflicts=MAX_RETRIES - 1)
+    counts = ImportMerger(flaky).commit(sites({"id": "i0", "nummer": "N1", "hersteller": "Wall"}))
+    assert counts["aktualisiert"] == 1 and flaky.attempts == MAX_RETRIES
+    assert storage.get("a")["hersteller"] == "Wall"
+
+
+def test_conflict_gives_up_after_retries(storage):
+    flaky = FlakyStorage(storage, conflicts=MAX_RETRIES)
+    merger = ImportMerger(flaky)
+    with pytest.raises(ConflictError):
+        merger.commit(sites({"id": "i0", "nummer": "N1", "hersteller": "Wall"}))
+    assert flaky.attempts == MAX_RETRIES
+    assert storage.get("a")["hersteller"] == ""
+    # Danach geht es mit neu aufgebautem Index weiter
+    assert merger.commit(sites({"id": "i1", "nummer": "N1", "hersteller": "Wall"}))["aktualisiert"] == 1
+
+
+def test_foreign_write_rebuilds_index(storage):
+    merger = ImportMerger(storage)
+    merger.commit(sites({"id": "i0", "nummer": "N1", "hersteller": "Wall"}))
+    # Jemand anderes legt einen Standort an: das nächste Stück muss ihn finden
+    storage.insert(sites({"id": "c", "nummer": "N3"}))
+    assert merger.commit(sites({"id": "i1", "nummer": "N3", "hersteller": "Ströer"}))["aktualisiert"] == 1
+    assert storage.get("c")["hersteller"] == "Ströer"
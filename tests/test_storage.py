@@ -0,0 +1,40 @@
+import sqlite3
+
+from conftest import sites
+
+from standort.storage import CsvStorage, SqliteStorage
+
+
+def _legacy_csv(data_dir):
+    path = str(data_dir / "locations.csv")
+    CsvStorage(path).replace_all(sites({"id": "a", "nummer": "N1"}, {"id": "a", "nummer": "N2"}, {"id": "", "nummer": "N3"}))
+    return path
+
+
+def test_migration_copies_once(data_dir):
+    csv = _legacy_csv(data_dir)
+    db = str(data_dir / "locations.sqlite")
+    store = SqliteStorage(db, migrate_from=csv)
+    # Doppelte und fehlende ids bekommen ein Suffix, keine Zeile geht verloren
+    assert sorted(store.load()["id"]) == ["a", "a-2", "ohne-id-2"]
+    store.delete(["a"])
+    # Erneutes Öffnen übernimmt die CSV nicht noch einmal
+    assert sorted(SqliteStorage(db, migrate_from=csv).load()["id"]) == ["a-2", "ohne-id-2"]
+
+
+def test_migration_skips_filled_legacy_db(data_dir):
+    csv = _legacy_csv(data_dir)
+    db = str(data_dir / "locations.sqlite")
+    SqliteStorage(db, migrate_from=None).insert(sites({"id": "x", "nummer": "N9"}))
+    # Datenbank von vor dem Merker: gilt als übernommen, wird nur markiert
+    assert SqliteStorage(db, migrate_from=csv).load()["id"].tolist() == ["x"]
+    with sqlite3.connect(db) as conn:
+        assert conn.execute("SELECT value FROM meta WHERE key = 'migrated'").fetchone() == (1,)
+
+
+def test_migration_without_csv(data_dir):
+    db = str(data_dir / "locations.sqlite")
+    assert SqliteStorage(db, migrate_from=str(data_dir / "fehlt.csv")).load().empty
+    # Eine später auftauchende CSV wird nicht mehr übernommen
+    csv = _legacy_csv(data_dir)
+    assert SqliteStorage(db, migrate_from=csv).load().empty
@@ -0,0 +1,25 @@
+import os
+
+import pytest
+
+from standort.thumbs import ensure_thumbnail
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def _photo(path, color):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.new("RGB", (400, 300), color).save(path)
+    return path
+
+
+def test_same_stem_keeps_separate_thumbnails(data_dir):
+    sources = [_photo("data/images/a.jpg", "red"), _photo("data/images/a.png", "red"), _photo("data/images/x/a.jpg", "red")]
+    thumbs = [ensure_thumbnail(src) for src in sources]
+    assert len(set(thumbs)) == 3 and all(os.path.exists(t) for t in thumbs)
+    # Neues Foto unter gleichem Namen: nur dessen alter Thumbnail wird aufgeräumt
+    _photo("data/images/a.jpg", "blue")
+    os.utime(sources[0], ns=(0, 10**18))
+    fresh = ensure_thumbnail(sources[0])
+    assert fresh != thumbs[0] and not os.path.exists(thumbs[0])
+    assert os.path.exists(thumbs[1]) and os.path.exists(thumbs[2])